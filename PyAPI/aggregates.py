@@ -0,0 +1,114 @@
+import datetime
+from sqlalchemy import func, case, Float
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from caching import LRUCache
+from colors import count_by_color, mask_for_id
+from models import db, Performance, Match, Event, Deck, Decklist, Card, Printing
+
+class seconds_between(FunctionElement):
+    # database side (end - start) in seconds, every dialect spells this differently
+    type = Float()
+    inherit_cache = True
+    name = 'seconds_between'
+
+@compiles(seconds_between)
+def compile_seconds_between(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'ROUND((julianday(%s) - julianday(%s)) * 86400)' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+@compiles(seconds_between, 'mysql')
+def compile_seconds_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'TIMESTAMPDIFF(SECOND, %s, %s)' % (compiler.process(start, **kw), compiler.process(end, **kw))
+
+@compiles(seconds_between, 'postgresql')
+def compile_seconds_between_postgresql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'EXTRACT(EPOCH FROM (%s - %s))' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+def count_if(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+def as_int(value):
+    # SUM comes back as Decimal on mysql and None over no rows
+    return int(value or 0)
+
+def themed_filters(includethemed):
+    if not includethemed or includethemed != "true":
+        return [Event.themed==False]
+    return []
+
+def color_totals(*filters):
+    # plays and wins grouped per deck identity in the database (at most 32 rows), then spread over colors by mask
+    rows = db.session.query(Deck.identityid, func.count(Performance.id), count_if(Performance.placement == 1)).select_from(Performance)\
+        .join(Match, Match.id==Performance.matchid)\
+        .join(Event, Event.id==Match.eventid)\
+        .join(Deck, Deck.id==Performance.deckid)\
+        .filter(Performance.placement != None)\
+        .filter(*filters)\
+        .group_by(Deck.identityid).all()
+    rows = [(identityid, as_int(plays), as_int(wins)) for identityid, plays, wins in rows if mask_for_id(identityid) is not None]
+
+    bycolor = count_by_color(rows)
+    plays = {c: v[0] for c, v in bycolor.items()}
+    wins = {c: v[1] for c, v in bycolor.items()}
+    return sum(r[1] for r in rows), plays, wins
+
+def color_winrates(plays, wins):
+    return {c: wins[c]/plays[c] if plays[c] > 0 else wins[c] for c in plays}
+
+def finished_match_totals(*filters):
+    # count and average length of finished matches
+    row = db.session.query(func.count(Match.id), func.avg(seconds_between(Match.start, Match.end)))\
+        .join(Event, Event.id==Match.eventid)\
+        .filter(Match.end != None)\
+        .filter(*filters).one()
+    return as_int(row[0]), float(row[1] or 0)
+
+def parse_date_arg(args, name):
+    # optional yyyy-mm-dd (or full iso) query parameter, raises ValueError on junk
+    value = args.get(name)
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value)
+
+def card_performance_totals(*filters, since=None, until=None):
+    # per card plays, wins and placement sum grouped in the database, optionally limited to a match date window
+    q = db.session.query(Decklist.cardid.label('cardid'),
+                         func.count(Performance.id).label('plays'),
+                         count_if(Performance.placement == 1).label('wins'),
+                         func.coalesce(func.sum(Performance.placement), 0).label('placementtotal'))\
+        .select_from(Performance)\
+        .join(Decklist, Decklist.deckid==Performance.deckid)
+    if since or until:
+        q = q.join(Match, Match.id==Performance.matchid)
+        if since:
+            q = q.filter(Match.start >= since)
+        if until:
+            q = q.filter(Match.start < until)
+    return q.filter(*filters).group_by(Decklist.cardid)
+
+artcrop_cache = LRUCache('artcrops', maxsize=1, ttl=3600)
+
+def default_artcrops():
+    # cardid -> artcrop of the card's default (lowest id) printing, rebuilt when printings are imported
+    arts = artcrop_cache.get('map')
+    if arts is None:
+        first = db.session.query(Printing.cardid, func.min(Printing.id).label('printingid')).group_by(Printing.cardid).subquery()
+        arts = dict(db.session.query(first.c.cardid, Printing.artcrop).join(Printing, Printing.id==first.c.printingid).all())
+        artcrop_cache.set('map', arts)
+    return arts
+
+def card_stats(since=None, before=None):
+    totals = card_performance_totals(since=since, until=before).subquery()
+    rows = db.session.query(Card, totals.c.plays, totals.c.wins, totals.c.placementtotal)\
+        .join(totals, totals.c.cardid==Card.id).all()
+    arts = default_artcrops()
+    cards = []
+    for card, plays, wins, placementtotal in rows:
+        entry = {"card": card, "count": as_int(plays), "placementtotal": as_int(placementtotal), "wins": as_int(wins)}
+        if card.id in arts:
+            entry["artcrop"] = arts[card.id]
+        cards.append((card.id, entry))
+    return cards
@@ -0,0 +1,170 @@
+import datetime
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if __package__ in (None, ''):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.harness import load_app, token, clear_caches
+
+# every route is run against generated fixtures at two sizes (same users, four times the data) and must stay
+# within its declared number of sql statements at both, and must not need more on the bigger fixture.
+# the probe deck and the decklists sent in request bodies grow with the fixture too, so per card queries show up.
+# new routes fail here until they get an entry.
+#   python -m bench.budgets
+SCALES = [
+    ({'users': 12, 'cards': 400, 'decks': 40, 'events': 6, 'matches': 2}, 20),
+    ({'users': 12, 'cards': 1600, 'decks': 160, 'events': 24, 'matches': 8}, 80),
+]
+PASSWORD = 'budgetpass'
+
+def decklist_text(fx):
+    from bench.datagen import card_name
+    return '\n'.join(['1 %s *CMDR*' % card_name(0)] + ['1 %s' % card_name(i) for i in range(1, fx['size'])])
+
+# endpoint -> (method, max statements on a cold cache including the auth lookup, url values, json body), values and
+# bodies can be functions of the fixture. reads run first, then the writes in this order
+BUDGETS = {
+    'get_card': ('GET', 2, {'id': 'card1'}, None),
+    'get_banlist': ('GET', 2, {}, None),
+    'get_watchlist': ('GET', 2, {}, None),
+    'get_printfavorites': ('GET', 2, {}, None),
+    'get_coloridentities': ('GET', 2, {}, None),
+    'get_themes': ('GET', 3, {}, None),
+    'get_user_decks': ('GET', 2, {}, None),
+    'get_specified_user_decks_with_cards': ('GET', 3, {}, None),
+    'get_specified_user_decks': ('GET', 2, {'userid': 1}, None),
+    'get_deck_v2': ('GET', 10, lambda fx: {'id': fx['probe']}, None),
+    'get_tts_deck': ('GET', 7, lambda fx: {'id': fx['probe']}, None),
+    'get_decklist': ('GET', 4, lambda fx: {'id': fx['probe']}, None),
+    'get_events': ('GET', 3, {}, None),
+    'get_event_details': ('GET', 7, {'id': 1}, None),
+    'get_match_performances': ('GET', 2, {'id': 1}, {}),
+    'get_users': ('GET', 1, {}, None),
+    'get_job': ('GET', 2, {'id': 1}, None),
+    'get_jobs': ('GET', 2, {}, None),
+    'get_cache_stats': ('GET', 1, {}, None),
+    'get_metrics': ('GET', 0, {}, None),
+    'get_user_stats': ('GET', 3, {'id': 1}, None),
+    'get_global_stats': ('GET', 3, {}, None),
+    'get_watchlist_stats': ('GET', 2, {}, None),
+    'get_card_stats': ('GET', 3, {}, None),
+    'get_card_stats_custom': ('GET', 3, {}, None),
+    'get_allusers_stats': ('GET', 3, {}, None),
+    'get_users_stats': ('GET', 9, {'id': 1}, None),
+
+    'login': ('POST', 1, {}, {'username': 'user1', 'password': PASSWORD}),
+    'cards_from_decklist': ('POST', 2, {}, decklist_text),
+    'check_decklist': ('POST', 1, {}, decklist_text),
+    'check_decklists_bulk': ('POST', 2, {}, lambda fx: [decklist_text(fx)] * 4),
+    'create_deck': ('POST', 4, {}, {'name': 'Budget deck'}),
+    'create_deck_v2': ('POST', 10, {}, lambda fx: {'name': 'Budget import', 'list': decklist_text(fx)}),
+    'update_deck': ('PUT', 6, {}, lambda fx: {'id': fx['probe'], 'name': 'Probe renamed'}),
+    'update_deck_v2': ('PUT', 10, lambda fx: {'id': fx['probe']}, {'prop': 'name', 'val': 'Probe renamed again'}),
+    'steal_deck': ('POST', 7, lambda fx: {'id': fx['probe']}, None),
+    'clone_decks': ('POST', 13, {}, lambda fx: {'deckids': [fx['probe']] + fx['spare']}),
+    'update_printfavorite': ('POST', 7, {}, {'card': 'card1', 'print': 'print1-1'}),
+    'remove_deck': ('PUT', 7, lambda fx: {'id': fx['spare'][0]}, None),
+    'remove_unused_decks': ('PUT', 6, {}, lambda fx: {'deckids': fx['spare'][1:]}),
+    'create_event': ('POST', 3, {}, {'name': 'Budget event', 'weekly': False}),
+    'update_event': ('PUT', 3, {}, {'id': 1, 'name': 'Budget event renamed'}),
+    'create_match': ('POST', 5, {}, '1'),
+    'update_match': ('PUT', 5, {}, {'matchid': 1, 'prop': 'Casual'}),
+    'create_performance': ('POST', 5, {}, {'matchid': 1, 'userid': 2}),
+    'update_performance': ('PUT', 10, {}, {'id': 1, 'placement': 2}),
+    'create_user': ('POST', 5, {}, {'username': 'budgetuser', 'password': PASSWORD}),
+    'update_user': ('PUT', 3, {'username': 'user2'}, {}),
+    'update_user_pass': ('PUT', 6, {'username': 'user2'}, 'abcd'),
+    'update_banlist': ('PUT', 5, {}, lambda fx: {'cardids': fx['cards'], 'banned': True}),
+    'add_all_tokens': ('POST', 3, {}, None),
+    'resume_failed_job': ('POST', 4, lambda fx: {'id': fx['failedjob']}, None),
+}
+
+def get_routes(app):
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint != 'static'})
+
+def build_fixture(app, scale, size):
+    # returns the ids the requests above need
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from models import db, Job, User, Deck, Decklist
+    from bench.datagen import generate
+    import cardnames
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(log=lambda message: None, **scale)
+        probe = scale['decks'] + 1
+        now = datetime.datetime(2025, 1, 1)
+        # the probe and three unplayed decks for the delete routes, all of them listing the first size cards
+        spare = [probe + 1, probe + 2, probe + 3]
+        db.session.execute(insert(Deck), [{'id': d, 'userid': 1, 'name': 'Probe' if d == probe else 'Spare', 'commander': 'card0', 'identityid': 1, 'lastupdated': now, 'islegal': False, 'power': 0} for d in [probe] + spare])
+        db.session.execute(insert(Decklist), [{'deckid': d, 'cardid': 'card%d' % i, 'count': 1, 'iscommander': i == 0, 'iscompanion': False, 'issideboard': False} for d in [probe] + spare for i in range(size)])
+        db.session.get(User, 1).hash = generate_password_hash(PASSWORD)
+        db.session.add(Job(kind='bulktokens', status='done', progress=0, userid=1, created=now, updated=now))
+        failed = Job(kind='deckimport', status='failed', params=json.dumps({'name': 'Probe', 'list': '', 'user': 1}), checkpoint=json.dumps({'deckid': probe}),
+                     progress=1, total=1, error='interrupted', userid=1, created=now, updated=now)
+        db.session.add(failed)
+        db.session.commit()
+        cardnames.load_names()
+        return {'size': size, 'probe': probe, 'spare': spare, 'failedjob': failed.id, 'cards': ['card%d' % i for i in range(size)]}
+
+def wait_for_jobs(app, timeout=60):
+    # background jobs started by a request finish before the next one so they never share the database with it
+    from models import db, Job
+    deadline = time.monotonic() + timeout
+    with app.app_context():
+        while Job.query.filter(Job.status.in_(('queued', 'running'))).count():
+            if time.monotonic() > deadline:
+                raise SystemExit('background jobs did not finish')
+            time.sleep(0.05)
+            db.session.remove()
+
+def resolve(value, fx):
+    return value(fx) if callable(value) else value
+
+def count_queries(app, routes, fx):
+    from flask import url_for
+    client = app.test_client()
+    headers = {'x-access-token': token(app, 1)}
+    counts = {}
+    for endpoint in routes:
+        method, budget, values, body = BUDGETS[endpoint]
+        with app.test_request_context():
+            path = url_for(endpoint, **resolve(values, fx))
+        clear_caches()
+        res = client.open(path, method=method, headers=headers, json=resolve(body, fx))
+        if res.status_code >= 400:
+            raise SystemExit(f'{endpoint}: {method} {path} returned {res.status_code}')
+        counts[endpoint] = int(res.headers['X-Query-Count'])
+        wait_for_jobs(app)
+    return counts
+
+def main():
+    dbpath = Path(tempfile.gettempdir()) / 'bbsiteapi-budgets.db'
+    app = load_app(dbpath)
+    routes = get_routes(app)
+    failures = [f'{e}: no query budget declared' for e in routes if e not in BUDGETS]
+    routes = [e for e in BUDGETS if e in routes]
+
+    runs = []
+    for scale, size in SCALES:
+        fx = build_fixture(app, scale, size)
+        runs.append(count_queries(app, routes, fx))
+
+    print(f"{'endpoint':<40}{'method':>7}{'budget':>7}{'small':>7}{'large':>7}")
+    for e in routes:
+        small, large = runs[0][e], runs[-1][e]
+        print(f'{e:<40}{BUDGETS[e][0]:>7}{BUDGETS[e][1]:>7}{small:>7}{large:>7}')
+        if max(small, large) > BUDGETS[e][1]:
+            failures.append(f'{e}: {max(small, large)} statements, budget is {BUDGETS[e][1]}')
+        if large > small:
+            failures.append(f'{e}: statements grow with the data, {small} -> {large}')
+    for f in failures:
+        print('FAIL ' + f)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import datetime
+import random
+from sqlalchemy import insert
+from models import db, User, Card, Deck, Coloridentity, Event, Match, Performance, Theme, Decklist, Printing, Cardtoken, Printfavorite
+from rollups import rebuild_rollups
+
+# synthetic data shaped like the live site: weekly events of four player pods, 60 card decks with a commander
+SCALES = {
+    'small': {'users': 60, 'cards': 3000, 'decks': 600, 'events': 52, 'matches': 4},
+    'medium': {'users': 500, 'cards': 12000, 'decks': 8000, 'events': 156, 'matches': 8},
+    'large': {'users': 3000, 'cards': 30000, 'decks': 50000, 'events': 520, 'matches': 12},
+}
+CHUNK = 20000
+
+def insert_rows(model, rows):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(insert(model), rows[i:i + CHUNK])
+
+def card_name(i):
+    return 'Bench Card %d' % i
+
+def generate(users, cards, decks, events, matches, seed=1, log=print):
+    rnd = random.Random(seed)
+    now = datetime.datetime(2025, 1, 1)
+
+    # ids follow the 5 bit masks so colorless is 1 like the live table
+    insert_rows(Coloridentity, [{'id': mask + 1, 'name': format(mask, '05b'), 'white': bool(mask & 1), 'blue': bool(mask & 2), 'black': bool(mask & 4), 'red': bool(mask & 8), 'green': bool(mask & 16)} for mask in range(32)])
+    insert_rows(Theme, [{'id': i, 'name': 'Theme %d' % i, 'stylename': 'theme%d' % i} for i in range(1, 6)])
+    insert_rows(User, [{'id': i, 'publicid': 'bench%d' % i, 'username': 'user%d' % i, 'admin': i == 1} for i in range(1, users + 1)])
+
+    cardrows = []
+    for i in range(cards):
+        name = card_name(i) if i % 50 else card_name(i) + ' // Bench Face %d' % i
+        cardrows.append({'id': 'card%d' % i, 'name': name, 'typeline': 'Creature', 'oracletext': 'Does a thing.', 'mv': i % 8, 'cost': '{%d}' % (i % 8),
+                         'identityid': rnd.randint(1, 32), 'banned': i % 211 == 7, 'watchlist': i % 97 == 3, 'custom': i % 157 == 11, 'transform': None})
+    insert_rows(Card, cardrows)
+    printingrows = []
+    for i in range(cards):
+        for p in range(1 + i % 3):
+            printingrows.append({'id': 'print%d-%d' % (i, p), 'cardid': 'card%d' % i, 'cardimage': 'https://img/%d/%d/large.jpg' % (i, p), 'artcrop': 'https://img/%d/%d/crop.jpg' % (i, p), 'releasedate': now - datetime.timedelta(days=30 * p + i % 365)})
+    insert_rows(Printing, printingrows)
+    insert_rows(Cardtoken, [{'cardid': 'card%d' % i, 'tokenid': 'card%d' % ((i * 7) % cards)} for i in range(0, cards, 20)])
+    log(f'{cards} cards, {len(printingrows)} printings')
+
+    deckrows = []
+    decklists = []
+    userdecks = {}
+    for d in range(1, decks + 1):
+        userid = (d - 1) % users + 1
+        chosen = rnd.sample(range(cards), 61)
+        deckrows.append({'id': d, 'userid': userid, 'name': 'Deck %d' % d, 'commander': 'card%d' % chosen[0], 'identityid': cardrows[chosen[0]]['identityid'],
+                         'lastupdated': now - datetime.timedelta(days=d % 700), 'islegal': True, 'power': 0})
+        decklists.append(chosen)
+        userdecks.setdefault(userid, []).append(d)
+    insert_rows(Deck, deckrows)
+
+    # first card is the commander, the last one sits in the sideboard
+    listrows = []
+    for d, chosen in enumerate(decklists, 1):
+        for i, c in enumerate(chosen):
+            listrows.append({'deckid': d, 'cardid': 'card%d' % c, 'count': 1, 'iscommander': i == 0, 'iscompanion': False, 'issideboard': i == 60})
+        if len(listrows) >= CHUNK:
+            insert_rows(Decklist, listrows)
+            listrows = []
+    insert_rows(Decklist, listrows)
+    log(f'{decks} decks, {decks * 61} decklist rows')
+
+    eventrows = []
+    matchrows = []
+    perfrows = []
+    matchid = 0
+    for e in range(1, events + 1):
+        time = now - datetime.timedelta(weeks=events - e)
+        themed = e % 4 == 0
+        eventrows.append({'id': e, 'name': 'Weekly %d' % e, 'time': time, 'themed': themed, 'themeid': (e % 5) + 1 if themed else None, 'weekly': True})
+        for m in range(matches):
+            matchid += 1
+            start = time + datetime.timedelta(minutes=15 * m)
+            matchrows.append({'id': matchid, 'eventid': e, 'name': 'Match %d' % (m + 1), 'start': start, 'end': start + datetime.timedelta(minutes=rnd.randint(20, 90)), 'winconid': rnd.randint(1, 5), 'power': 0})
+            players = rnd.sample(range(1, users + 1), 4)
+            placements = rnd.sample(range(1, 5), 4)
+            for order, (userid, placement) in enumerate(zip(players, placements)):
+                deckid = rnd.choice(userdecks[userid]) if userid in userdecks else None
+                perfrows.append({'matchid': matchid, 'userid': userid, 'deckid': deckid, 'order': order + 1, 'placement': placement, 'killedby': None})
+    insert_rows(Event, eventrows)
+    insert_rows(Match, matchrows)
+    insert_rows(Performance, perfrows)
+    insert_rows(Printfavorite, [{'userid': (i % users) + 1, 'cardid': 'card%d' % i, 'printingid': 'print%d-0' % i} for i in range(0, cards, 10)])
+    db.session.commit()
+    log(f'{events} events, {matchid} matches, {len(perfrows)} performances')
+
+    rebuild_rollups()
@@ -0,0 +1,74 @@
+import configparser
+import datetime
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# shared setup for the benchmark and query budget scripts: the app is pointed at a throwaway sqlite
+# database through BBSITEAPI_CONFIG before main is imported, so the real config.ini is never touched
+PYAPI = Path(__file__).resolve().parent.parent
+SECRET = 'bench-secret'
+API_VERSION = 'bench'
+
+class StubScryfall:
+    # stands in for the scryfall client, every lookup misses and the calls are only counted
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, path):
+        self.calls += 1
+        return None
+
+    def get_many(self, paths):
+        return [self.get(p) for p in paths]
+
+    def search_all(self, path):
+        self.get(path)
+        return []
+
+    def cards_by_oracle(self, oracleids):
+        return self.get_many(oracleids)
+
+    def prints_by_oracle(self, oracleids):
+        return [self.search_all(o) for o in oracleids]
+
+def write_config(dbpath):
+    config = configparser.ConfigParser()
+    config['SECURITY'] = {'SECRET_KEY': SECRET}
+    config['DATABASE'] = {'CONNECTION': 'sqlite:///' + str(Path(dbpath).resolve())}
+    config['API'] = {'VERSION': API_VERSION}
+    config['METRICS'] = {'HEADERS': 'true'}
+    fd, path = tempfile.mkstemp(prefix='bbsiteapi-', suffix='.ini')
+    with os.fdopen(fd, 'w') as fp:
+        config.write(fp)
+    return path
+
+def load_app(dbpath):
+    # returns the flask app bound to dbpath with rate limits off and scryfall stubbed
+    os.environ['BBSITEAPI_CONFIG'] = write_config(dbpath)
+    if str(PYAPI) not in sys.path:
+        sys.path.insert(0, str(PYAPI))
+    import main
+    import scryfall
+    main.limiter.enabled = False
+    scryfall._client = StubScryfall()
+    return main.app
+
+def token(app, userid):
+    import jwt
+    return jwt.encode({'uid': userid, 'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1), 'version': app.config['API_VERSION']}, app.config['SECRET_KEY'])
+
+def clear_caches():
+    from caching import CACHES
+    for cache in CACHES.values():
+        cache.clear()
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
@@ -0,0 +1,131 @@
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if __package__ in (None, ''):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench.harness import load_app, token, clear_caches, percentile
+
+# times the hot endpoints through the flask test client against a generated database. only query counts are gated by
+# default, latency depends on the machine so it is only compared on request and against a baseline taken on the same one
+#   python -m bench.run --scale small                                   compare query counts with bench/baseline-small.json
+#   python -m bench.run --scale small --save-baseline                   record a new baseline
+#   python -m bench.run --save-baseline --baseline /tmp/mine.json       then later, on the same machine
+#   python -m bench.run --baseline /tmp/mine.json --latency             also fail on p90 slowdowns
+BENCH_DIR = Path(__file__).resolve().parent
+
+def scenarios(scale, rnd):
+    from bench.datagen import card_name
+    users, cards, decks, events = scale['users'], scale['cards'], scale['decks'], scale['events']
+
+    def decklist():
+        chosen = rnd.sample(range(cards), 60)
+        return '\n'.join(['1 %s *CMDR*' % card_name(chosen[0])] + ['1 %s' % card_name(c) for c in chosen[1:]])
+
+    return [
+        ('deck page', 'GET', lambda: ('/deck/v2/%d' % rnd.randint(1, decks), None)),
+        ('tts export', 'GET', lambda: ('/deck/tts/%d' % rnd.randint(1, decks), None)),
+        ('event details', 'GET', lambda: ('/event/%d' % rnd.randint(1, events), None)),
+        ('user stats', 'GET', lambda: ('/stats/user/%d/simple' % rnd.randint(1, users), None)),
+        ('global stats', 'GET', lambda: ('/stats/global/simple', None)),
+        ('watchlist stats', 'GET', lambda: ('/stats/watchlist', None)),
+        ('card stats', 'GET', lambda: ('/stats/cards', None)),
+        ('all users stats', 'GET', lambda: ('/stats/users', None)),
+        ('deck import', 'POST', lambda: ('/deck/v2', {'name': 'Bench import', 'list': decklist()})),
+    ]
+
+def run_scenarios(app, scale, iterations, seed=1):
+    rnd = random.Random(seed)
+    client = app.test_client()
+    headers = {'x-access-token': token(app, 1)}
+    results = {}
+    for name, method, request in scenarios(scale, rnd):
+        # every scenario starts cold so cached endpoints show their first hit as well
+        clear_caches()
+        latencies = []
+        queries = []
+        for _ in range(iterations):
+            path, body = request()
+            started = time.perf_counter()
+            res = client.open(path, method=method, json=body, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if res.status_code >= 400:
+                raise SystemExit(f'{name}: {method} {path} returned {res.status_code}')
+            queries.append(int(res.headers.get('X-Query-Count', 0)))
+        results[name] = {
+            'p50': round(percentile(latencies, 50), 2),
+            'p90': round(percentile(latencies, 90), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(max(latencies), 2),
+            'queries': int(percentile(queries, 50)),
+            'maxqueries': max(queries),
+        }
+    return results
+
+def compare(results, baseline, tolerance=None):
+    # query counts must not grow at all, latency is only checked with a tolerance and gets that much slack for noise
+    failures = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if r['maxqueries'] > b['maxqueries']:
+            failures.append(f"{name}: {r['maxqueries']} queries, baseline {b['maxqueries']}")
+        if tolerance is not None and r['p90'] > b['p90'] * tolerance:
+            failures.append(f"{name}: p90 {r['p90']}ms, baseline {b['p90']}ms")
+    return failures
+
+def main():
+    from bench.datagen import SCALES, generate
+    parser = argparse.ArgumentParser(description='Benchmark the hot endpoints against synthetic data')
+    parser.add_argument('--scale', default='small', choices=sorted(SCALES))
+    parser.add_argument('--db', help='sqlite file to use, generated when missing (default: one per scale in the temp dir)')
+    parser.add_argument('--rebuild', action='store_true', help='regenerate the database even if it exists')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', help='baseline json (default: bench/baseline-<scale>.json)')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--latency', action='store_true', help='also fail on p90 slowdowns, only meaningful against a baseline recorded on this machine')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='allowed p90 slowdown against the baseline with --latency')
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    dbpath = Path(args.db or Path(tempfile.gettempdir()) / f'bbsiteapi-bench-{args.scale}.db')
+    if args.rebuild and dbpath.exists():
+        dbpath.unlink()
+    fresh = not dbpath.exists()
+
+    app = load_app(dbpath)
+    from models import db
+    with app.app_context():
+        if fresh:
+            print(f'Generating {args.scale} data in {dbpath}')
+            started = time.perf_counter()
+            db.create_all()
+            generate(seed=args.seed, **scale)
+            print(f'Generated in {time.perf_counter() - started:.1f}s')
+    results = run_scenarios(app, scale, args.iterations, args.seed)
+
+    print(f"{'scenario':<18}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'queries':>9}{'max q':>7}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['p50']:>10}{r['p90']:>10}{r['p99']:>10}{r['max']:>10}{r['queries']:>9}{r['maxqueries']:>7}")
+
+    baselinepath = Path(args.baseline or BENCH_DIR / f'baseline-{args.scale}.json')
+    if args.save_baseline:
+        baselinepath.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Saved baseline to {baselinepath}')
+        return 0
+    if not baselinepath.exists():
+        print(f'No baseline at {baselinepath}, run with --save-baseline to record one')
+        return 0
+    failures = compare(results, json.loads(baselinepath.read_text()), args.tolerance if args.latency else None)
+    for f in failures:
+        print('REGRESSION ' + f)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import json
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+if __package__ in (None, ''):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scryfall import ScryfallClient, ScryfallError, SCRYFALL_URL
+
+# runs the scryfall client against a local stub of the api: retries, error mapping, paging, call counting and the
+# rate limit, nothing here talks to the real scryfall
+#   python -m bench.scryfall_check
+hits = {}
+hits_lock = threading.Lock()
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body, headers=None):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        with hits_lock:
+            hits[url.path] = hits.get(url.path, 0) + 1
+            count = hits[url.path]
+        if url.path == '/cards/ok' or url.path.startswith('/cards/many/'):
+            return self.send(200, {'object': 'card', 'path': url.path})
+        if url.path == '/cards/missing':
+            return self.send(404, {'object': 'error'})
+        if url.path == '/cards/throttled':
+            # two 429s before it answers, the first with a Retry-After
+            if count == 1:
+                return self.send(429, {'object': 'error'}, {'Retry-After': '0'})
+            if count == 2:
+                return self.send(429, {'object': 'error'})
+            return self.send(200, {'object': 'card'})
+        if url.path == '/cards/down':
+            return self.send(503, {'object': 'error'})
+        if url.path == '/cards/rejected':
+            return self.send(400, {'object': 'error', 'details': 'bad query'})
+        if url.path == '/cards/garbage':
+            return self.send(200, '<html>not json</html>')
+        if url.path == '/cards/search':
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            more = page < 3
+            return self.send(200, {'data': [{'page': page}], 'has_more': more,
+                                   'next_page': SCRYFALL_URL + '/cards/search?page=%d' % (page + 1) if more else None})
+        self.send(404, {'object': 'error'})
+
+def expect_error(client, path):
+    try:
+        client.get(path)
+    except ScryfallError:
+        return True
+    except Exception as e:
+        print(f'  {path} raised {type(e).__name__} instead of ScryfallError')
+    return False
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:%d' % server.server_address[1]
+    failures = []
+
+    def check(name, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failures.append(name)
+
+    client = ScryfallClient(base_url=base, rate=1000, retries=3, backoff=0.01)
+    check('200 decodes the json', client.get('/cards/ok') == {'object': 'card', 'path': '/cards/ok'})
+    check('404 is None', client.get('/cards/missing') is None)
+    check('429 is retried until it answers', client.get('/cards/throttled') == {'object': 'card'} and hits['/cards/throttled'] == 3)
+    check('5xx raises ScryfallError after the retries', expect_error(client, '/cards/down') and hits['/cards/down'] == 4)
+    check('other 4xx raise ScryfallError without retrying', expect_error(client, '/cards/rejected') and hits['/cards/rejected'] == 1)
+    check('a body that is not json raises ScryfallError', expect_error(client, '/cards/garbage'))
+    check('next_page is followed on the stub host', client.search_all('/cards/search?page=1') == [{'page': 1}, {'page': 2}, {'page': 3}])
+    unreachable = ScryfallClient(base_url='http://127.0.0.1:9', retries=1, backoff=0.01, timeout=1)
+    check('connection errors raise ScryfallError', expect_error(unreachable, '/cards/ok'))
+
+    # calls are counted from every worker thread, and the token bucket holds them to the rate after the first burst
+    client = ScryfallClient(base_url=base, rate=20, workers=8, backoff=0.01)
+    paths = ['/cards/many/%d' % i for i in range(60)]
+    started = time.monotonic()
+    results = client.get_many(paths)
+    elapsed = time.monotonic() - started
+    check('get_many keeps the order of its paths', [r['path'] for r in results] == paths)
+    check('every call is counted across threads', client.calls == len(paths))
+    check(f'rate limit holds ({elapsed:.2f}s for {len(paths)} calls at 20/s)', elapsed >= (len(paths) - 20) / 20 * 0.9)
+
+    server.shutdown()
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
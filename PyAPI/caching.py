@@ -0,0 +1,97 @@
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+from changes import table_versions
+
+CACHES = {}
+MISSING = object()
+
+class LRUCache:
+    # bounded, optionally expiring, thread safe; every cache registers itself so its counters can be watched
+    def __init__(self, name, maxsize=1024, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key, MISSING)
+            if entry is not MISSING and (entry[1] is None or entry[1] > time.monotonic()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not MISSING:
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def drop_where(self, predicate):
+        with self.lock:
+            for key in [k for k, v in self.entries.items() if predicate(v[0])]:
+                del self.entries[key]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+# last-modified is only sent, and If-Modified-Since only honoured, once the newest change is this old. the stored
+# times have one second resolution and are taken when a statement runs rather than when it commits, etags have neither problem
+LASTMODIFIED_SETTLE = datetime.timedelta(seconds=60)
+
+def conditional(*tables, public=True, max_age=60, scope=None):
+    # etag/last-modified driven by the version counters the database keeps for the tables a resource reads from,
+    # scope(**view_args) adds a stamp of the resource's own rows (those get an etag only). a matching validator
+    # answers 304 before the view runs, If-None-Match decides alone whenever it is sent (rfc 9110 13.1.3)
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            versions = table_versions(*tables)
+            stamp = scope(**kwargs) if scope else None
+            etag = hashlib.sha1(f'{request.full_path}:{versions}:{stamp}'.encode()).hexdigest()[:24]
+            lastmodified = max(v[1] for v in versions)
+            if scope or lastmodified > datetime.datetime.utcnow() - LASTMODIFIED_SETTLE:
+                lastmodified = None
+            cachecontrol = f'public, max-age={max_age}' if public else 'private, no-cache'
+
+            if request.if_none_match:
+                notmodified = etag in request.if_none_match
+            else:
+                notmodified = lastmodified is not None and request.if_modified_since is not None \
+                    and lastmodified <= request.if_modified_since.replace(tzinfo=None)
+            if notmodified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if lastmodified is not None:
+                response.last_modified = lastmodified
+            response.headers['Cache-Control'] = cachecontrol
+            return response
+        return decorated
+    return decorator
@@ -0,0 +1,97 @@
+import re
+import threading
+import unicodedata
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Card
+
+# pasted lists come from every deck site and clients mangle names differently, so names are matched on a
+# normalised key: casefolded, accents dropped, curly quotes and dashes straightened, " // " spacing fixed
+PUNCTUATION = str.maketrans({'‘': "'", '’': "'", 'ʼ': "'", '`': "'", '“': '"', '”': '"', '–': '-', '—': '-'})
+SPLIT_REGEX = re.compile(r'\s*/+\s*')
+
+_names = {} # normalised full name -> card id
+_aliases = {} # normalised face name -> card id, only used when no full name matches
+_loaded = False
+_lock = threading.Lock()
+
+def normalize_name(name):
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = SPLIT_REGEX.sub(' // ', name.translate(PUNCTUATION)).casefold()
+    return ' '.join(name.split())
+
+def _add(id, name):
+    # back faces of transforming cards are stored as their own /back rows, they point at the front card
+    if not name:
+        return
+    key = normalize_name(name)
+    if id.endswith('/back'):
+        _aliases.setdefault(key, id[:-len('/back')])
+        return
+    _names.setdefault(key, id)
+    if ' // ' in key:
+        for face in key.split(' // '):
+            _aliases.setdefault(face, id)
+
+def load_names():
+    rows = db.session.query(Card.id, Card.name).order_by(Card.id).all()
+    global _loaded
+    with _lock:
+        _names.clear()
+        _aliases.clear()
+        for id, name in rows:
+            _add(id, name)
+        _loaded = True
+
+def ensure_loaded():
+    if not _loaded:
+        load_names()
+
+def lookup(name):
+    key = normalize_name(name)
+    return _names.get(key) or _aliases.get(key)
+
+def resolve_names(names):
+    # maps each name to its card id (None when unknown), names the index misses are retried against
+    # the database once in case another process added them
+    ensure_loaded()
+    resolved = {n: lookup(n) for n in names}
+    missing = [n for n, id in resolved.items() if id is None]
+    if missing:
+        rows = db.session.query(Card.id, Card.name).filter(Card.name.in_(missing)).order_by(Card.id).all()
+        if rows:
+            with _lock:
+                for id, name in rows:
+                    _add(id, name)
+            for n in missing:
+                resolved[n] = lookup(n)
+    return resolved
+
+def cards_for_names(names):
+    # name -> Card for every name that resolves, one query for the whole list
+    ids = resolve_names(names)
+    wanted = {id for id in ids.values() if id}
+    cards = {c.id: c for c in Card.query.filter(Card.id.in_(wanted)).all()} if wanted else {}
+    return {n: cards[id] for n, id in ids.items() if id in cards}
+
+@event.listens_for(Session, 'after_flush')
+def note_card_names(session, flush_context):
+    if not _loaded:
+        return
+    names = [(c.id, c.name) for c in list(session.new) + list(session.dirty) if isinstance(c, Card)]
+    if names:
+        session.info.setdefault('card_names', []).extend(names)
+
+@event.listens_for(Session, 'after_commit')
+def add_committed_names(session):
+    # new cards join the index as they are committed instead of reloading the whole table
+    names = session.info.pop('card_names', None)
+    if names:
+        with _lock:
+            for id, name in names:
+                _add(id, name)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_rolled_back_names(session, previous_transaction):
+    session.info.pop('card_names', None)
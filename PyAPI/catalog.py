@@ -0,0 +1,203 @@
+import datetime
+import gzip
+import json
+from aggregates import artcrop_cache
+from helpers import scryfall_color_converter
+from models import db, Card, Printing, Cardtoken
+
+TOKEN_LAYOUTS = ('token', 'double_faced_token', 'emblem')
+SKIPPED_LAYOUTS = ('art_series',)
+CARD_FIELDS = ('name', 'typeline', 'oracletext', 'mv', 'cost', 'identityid', 'transform')
+PRINTING_FIELDS = ('cardid', 'cardimage', 'artcrop', 'releasedate')
+
+def iter_bulk_objects(fp, chunk_size=1 << 20):
+    # scryfall bulk files are one big json array so we decode it an object at a time
+    # instead of json.load-ing several hundred megabytes
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                pos += 1
+            if pos < len(buffer) and not started:
+                if buffer[pos] != '[':
+                    raise ValueError('Bulk data file is not a json array')
+                started = True
+                pos += 1
+                continue
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof and pos < len(buffer):
+                    raise
+                break
+            yield obj
+            pos = end
+        buffer = buffer[pos:]
+        if eof:
+            return
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+def open_bulk_file(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def is_token(r):
+    return r.get('set_type') == 'token' or r.get('layout') in TOKEN_LAYOUTS
+
+def parse_release(r):
+    if 'released_at' not in r:
+        return None
+    return datetime.datetime.strptime(r['released_at'], '%Y-%m-%d')
+
+def card_rows(r):
+    # mirrors how deck imports used to build cards from scryfall: transforming cards get a /back entry
+    identity = scryfall_color_converter(r.get('color_identity', []))
+    if 'card_faces' in r and not 'Adventure' in r['type_line']:
+        frontcard = r['card_faces'][0]
+        backcard = r['card_faces'][1]
+        return [
+            {'id': r['oracle_id'], 'name': r['name'], 'typeline': r['type_line'], 'oracletext': frontcard.get('oracle_text'), 'mv': r.get('cmc'), 'cost': frontcard.get('mana_cost'), 'identityid': identity, 'transform': True},
+            {'id': r['oracle_id'] + '/back', 'name': backcard['name'], 'typeline': backcard.get('type_line'), 'oracletext': backcard.get('oracle_text'), 'mv': r.get('cmc'), 'cost': backcard.get('mana_cost'), 'identityid': identity, 'transform': True},
+        ]
+    oracletext = r.get('oracle_text')
+    if oracletext is None and 'card_faces' in r:
+        oracletext = '\n//\n'.join(f.get('oracle_text', '') for f in r['card_faces'])
+    return [{'id': r['oracle_id'], 'name': r['name'], 'typeline': r['type_line'], 'oracletext': oracletext, 'mv': r.get('cmc'), 'cost': r.get('mana_cost'), 'identityid': identity, 'transform': None}]
+
+def printing_rows(p, cardid, withback=True):
+    released = parse_release(p)
+    if 'image_uris' in p:
+        return [{'id': p['id'], 'cardid': cardid, 'cardimage': p['image_uris']['large'], 'artcrop': p['image_uris']['art_crop'], 'releasedate': released}]
+    if 'card_faces' not in p or 'image_uris' not in p['card_faces'][0]:
+        return []
+    rows = [{'id': p['id'], 'cardid': cardid, 'cardimage': p['card_faces'][0]['image_uris']['large'], 'artcrop': p['card_faces'][0]['image_uris']['art_crop'], 'releasedate': released}]
+    if withback and 'image_uris' in p['card_faces'][1]:
+        rows.append({'id': p['id'] + '/back', 'cardid': cardid + '/back', 'cardimage': p['card_faces'][1]['image_uris']['large'], 'artcrop': p['card_faces'][1]['image_uris']['art_crop'], 'releasedate': released})
+    return rows
+
+def token_parts(r):
+    for c in r.get('all_parts', []):
+        if c.get('component') == 'token' or c.get('type_line', '').startswith('Emblem'):
+            yield c['id']
+
+def upsert_rows(model, rows, fields):
+    if not rows:
+        return 0
+    existing = {e.id: e for e in model.query.filter(model.id.in_(list(rows.keys()))).all()}
+    added = 0
+    for id, row in rows.items():
+        entry = existing.get(id)
+        if entry is None:
+            db.session.add(model(**row))
+            added += 1
+        else:
+            for f in fields:
+                setattr(entry, f, row[f])
+    return added
+
+def add_card_tokens(pairs):
+    # pairs is a set of (cardid, tokenid), existing rows are skipped so reimports dont duplicate
+    added = 0
+    pairs = list(pairs)
+    for i in range(0, len(pairs), 1000):
+        batch = pairs[i:i + 1000]
+        cardids = {c for c, _ in batch}
+        existing = set(db.session.query(Cardtoken.cardid, Cardtoken.tokenid).filter(Cardtoken.cardid.in_(cardids)).all())
+        for cardid, tokenid in batch:
+            if (cardid, tokenid) not in existing:
+                db.session.add(Cardtoken(cardid=cardid, tokenid=tokenid))
+                added += 1
+        db.session.commit()
+    return added
+
+def import_bulk_file(path, batch_size=1000, log=print):
+    stats = {'objects': 0, 'cards': 0, 'printings': 0, 'tokens': 0}
+    seen_cards = set()
+    token_oracles = {} # scryfall printing id -> token oracle id
+    pending_tokens = set() # (cardid, token printing id)
+    cards = {}
+    printings = {}
+
+    def flush():
+        stats['cards'] += upsert_rows(Card, cards, CARD_FIELDS)
+        stats['printings'] += upsert_rows(Printing, printings, PRINTING_FIELDS)
+        db.session.commit()
+        cards.clear()
+        printings.clear()
+        log(f"{stats['objects']} objects processed")
+
+    with open_bulk_file(path) as fp:
+        pending = 0
+        for r in iter_bulk_objects(fp):
+            stats['objects'] += 1
+            if 'oracle_id' not in r or r.get('layout') in SKIPPED_LAYOUTS:
+                continue
+            if is_token(r):
+                token_oracles[r['id']] = r['oracle_id']
+                for p in printing_rows(r, r['oracle_id']):
+                    printings[p['id']] = p
+            else:
+                rows = card_rows(r)
+                if r['oracle_id'] not in seen_cards:
+                    seen_cards.add(r['oracle_id'])
+                    for c in rows:
+                        cards[c['id']] = c
+                for tokenprint in token_parts(r):
+                    pending_tokens.add((r['oracle_id'], tokenprint))
+                for p in printing_rows(r, r['oracle_id'], withback=rows[0]['transform'] is not None):
+                    printings[p['id']] = p
+            pending += 1
+            if pending >= batch_size:
+                flush()
+                pending = 0
+        flush()
+    artcrop_cache.clear()
+
+    pairs = {(cardid, token_oracles[tp]) for cardid, tp in pending_tokens if tp in token_oracles}
+    stats['tokens'] = add_card_tokens(pairs)
+    return stats
+
+def fetch_card_tokens(cards, client, seen_tokens=None):
+    # looks up token parts for a batch of cards on scryfall, every lookup in the batch runs concurrently
+    seen_tokens = set() if seen_tokens is None else seen_tokens
+    cards = [c for c in cards if not c.id.endswith('/back')]
+    parts = {} # token uri -> cardids that make it
+    for card, rp in zip(cards, client.cards_by_oracle([c.id for c in cards])):
+        if not rp or not rp.get('data') or 'all_parts' not in rp['data'][0]:
+            continue
+        for c in rp['data'][0]['all_parts']:
+            if c['component'] == 'token' or c['type_line'].startswith('Emblem'):
+                parts.setdefault(c['uri'], []).append(card.id)
+
+    uris = list(parts)
+    pairs = set()
+    newtokens = []
+    for uri, ti in zip(uris, client.get_many(uris)):
+        if not ti or 'oracle_id' not in ti:
+            continue
+        for cardid in parts[uri]:
+            pairs.add((cardid, ti['oracle_id']))
+        if ti['oracle_id'] not in seen_tokens:
+            seen_tokens.add(ti['oracle_id'])
+            newtokens.append(ti['oracle_id'])
+
+    printings = {}
+    for oracleid, prints in zip(newtokens, client.prints_by_oracle(newtokens)):
+        for p in prints:
+            for row in printing_rows(p, oracleid):
+                printings[row['id']] = row
+    added = upsert_rows(Printing, printings, PRINTING_FIELDS)
+    db.session.commit()
+    if added:
+        artcrop_cache.clear()
+    return {'printings': added, 'tokens': add_card_tokens(pairs)}
@@ -0,0 +1,116 @@
+import datetime
+import sqlalchemy as sa
+from sqlalchemy import event, insert, func
+from sqlalchemy.orm import Session
+from models import db, Changelog, Tableversion, User, Performance, Match, Deck
+
+# rows of these tables get a changelog entry whenever they are inserted, updated or deleted through the orm, they are
+# what /stats/users/<id> sends row by row (the card catalog goes whole when its table versions move)
+TRACKED_MODELS = (User, Performance, Match, Deck)
+
+# tables behind etags and in process caches get a row in tableversion that database triggers move on every insert,
+# update and delete (see install_version_triggers), so writes from any worker, cli command or hand run sql are counted
+def table_versions(*tablenames):
+    # [(version, last modified)] in argument order from one query, a table without a row yet reports (0, now)
+    rows = {r.tablename: (r.version, r.updated) for r in db.session.query(Tableversion.tablename, Tableversion.version, Tableversion.updated)\
+            .filter(Tableversion.tablename.in_(tablenames))}
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    return [rows.get(t, (0, now)) for t in tablenames]
+
+def table_version(tablename):
+    return table_versions(tablename)[0]
+
+def install_version_triggers(conn, tablenames):
+    # idempotent, used by the migrations that start versioning a table
+    if conn.dialect.name == 'sqlite':
+        existing = {r[0] for r in conn.execute(sa.text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))}
+        now = 'CURRENT_TIMESTAMP'
+    elif conn.dialect.name == 'mysql':
+        existing = {r[0] for r in conn.execute(sa.text('SELECT trigger_name FROM information_schema.triggers WHERE trigger_schema = DATABASE()'))}
+        now = 'UTC_TIMESTAMP()'
+    else:
+        raise ValueError(f'No version triggers for {conn.dialect.name}')
+    tables = set(sa.inspect(conn).get_table_names())
+    seeded = {r[0] for r in conn.execute(sa.select(Tableversion.tablename))}
+    for t in tablenames:
+        if t not in tables:
+            continue
+        if t not in seeded:
+            conn.execute(insert(Tableversion).values(tablename=t, version=0, updated=datetime.datetime.utcnow().replace(microsecond=0)))
+        for op in ('insert', 'update', 'delete'):
+            name = f'tv_{t}_{op}'
+            if name not in existing:
+                conn.execute(sa.text(f"CREATE TRIGGER {name} AFTER {op.upper()} ON {t} FOR EACH ROW BEGIN "
+                                     f"UPDATE tableversion SET version = version + 1, updated = {now} WHERE tablename = '{t}'; END"))
+
+@event.listens_for(Session, 'after_flush')
+def track_changes(session, flush_context):
+    now = datetime.datetime.utcnow()
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, TRACKED_MODELS):
+            rows.append({'tablename': obj.__tablename__, 'rowid': str(obj.id), 'deleted': False, 'changed': now})
+    for obj in session.dirty:
+        if isinstance(obj, TRACKED_MODELS) and session.is_modified(obj, include_collections=False):
+            rows.append({'tablename': obj.__tablename__, 'rowid': str(obj.id), 'deleted': False, 'changed': now})
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED_MODELS):
+            rows.append({'tablename': obj.__tablename__, 'rowid': str(obj.id), 'deleted': True, 'changed': now})
+    session.info.setdefault('changelog', []).extend(rows)
+
+def record_changes(model, rowids, deleted=False):
+    # bulk update/delete statements skip the flush hook, callers that use them on tracked tables log here
+    now = datetime.datetime.utcnow()
+    rows = [{'tablename': model.__tablename__, 'rowid': str(id), 'deleted': deleted, 'changed': now} for id in rowids]
+    db.session.info.setdefault('changelog', []).extend(rows)
+
+@event.listens_for(Session, 'before_commit')
+def write_changelog(session):
+    # entries are written last thing before the commit while holding the lock on the changelog version row, so ids are
+    # handed out in commit order and no entry can show up below an id a client has already read as its cursor
+    session.flush()
+    rows = session.info.pop('changelog', None)
+    if not rows:
+        return
+    conn = session.connection()
+    table = Tableversion.__table__
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    if conn.execute(table.update().where(table.c.tablename == 'changelog').values(version=table.c.version + 1, updated=now)).rowcount == 0:
+        conn.execute(table.insert().values(tablename='changelog', version=1, updated=now))
+    conn.execute(insert(Changelog), rows)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_changelog(session, previous_transaction):
+    session.info.pop('changelog', None)
+
+def touch_decks(deckids):
+    # bumps the version of decks whose page or export changed without the deck itself being edited (performances,
+    # print favorites), lastupdated stays the time of the last real edit
+    deckids = list({id for id in deckids if id is not None})
+    if deckids:
+        Deck.query.filter(Deck.id.in_(deckids)).update({Deck.version: Deck.version + 1}, synchronize_session=False)
+
+def current_cursor():
+    return db.session.query(func.max(Changelog.id)).scalar() or 0
+
+def oldest_cursor():
+    return db.session.query(func.min(Changelog.id)).scalar()
+
+def changed_since(model, since, cursor):
+    # returns (changed ids, deleted ids) for a table between two cursors, the latest entry per row wins
+    entries = db.session.query(Changelog.rowid, Changelog.deleted)\
+        .filter(Changelog.tablename==model.__tablename__)\
+        .filter(Changelog.id > since).filter(Changelog.id <= cursor)\
+        .order_by(Changelog.id).all()
+    idtype = model.id.type.python_type
+    state = {}
+    for rowid, deleted in entries:
+        state[idtype(rowid)] = deleted
+    changed = [id for id, deleted in state.items() if not deleted]
+    removed = [id for id, deleted in state.items() if deleted]
+    return changed, removed
+
+def prune_changelog(before):
+    count = Changelog.query.filter(Changelog.changed < before).delete(synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,75 @@
+import threading
+from models import Coloridentity
+
+# identities are 5 bit masks, merging two is just an or
+WHITE = 1
+BLUE = 2
+BLACK = 4
+RED = 8
+GREEN = 16
+
+SCRYFALL_BITS = {'W': WHITE, 'U': BLUE, 'B': BLACK, 'R': RED, 'G': GREEN}
+# the single letter keys the stats endpoints have always used
+STAT_BITS = {'b': BLACK, 'u': BLUE, 'r': RED, 'g': GREEN, 'w': WHITE}
+COLORLESS_ID = 1
+
+_mask_to_id = {}
+_id_to_mask = {}
+_lock = threading.Lock()
+
+def load_identities():
+    # the coloridentity table never changes, read it once and keep both directions in memory
+    masks = {}
+    for c in Coloridentity.query.all():
+        masks[c.id] = (WHITE if c.white else 0) | (BLUE if c.blue else 0) | (BLACK if c.black else 0) | (RED if c.red else 0) | (GREEN if c.green else 0)
+    with _lock:
+        _id_to_mask.clear()
+        _id_to_mask.update(masks)
+        _mask_to_id.clear()
+        _mask_to_id.update({m: id for id, m in masks.items()})
+
+def ensure_loaded():
+    if not _id_to_mask:
+        load_identities()
+
+def mask_from_scryfall(colors):
+    mask = 0
+    for c in colors:
+        mask |= SCRYFALL_BITS.get(c, 0)
+    return mask
+
+def id_for_mask(mask):
+    ensure_loaded()
+    return _mask_to_id.get(mask)
+
+def mask_for_id(identityid):
+    ensure_loaded()
+    return _id_to_mask.get(identityid)
+
+def merge_identities(*identityids):
+    mask = 0
+    for id in identityids:
+        mask |= mask_for_id(id) or 0
+    return id_for_mask(mask)
+
+def stat_colors(identityid):
+    # stat color keys ('b', 'u', ... and 'c' for colorless) for an identity, None if the identity is unknown
+    mask = mask_for_id(identityid)
+    if mask is None:
+        return None
+    colors = [c for c, bit in STAT_BITS.items() if mask & bit]
+    if identityid == COLORLESS_ID:
+        colors.append('c')
+    return colors
+
+def count_by_color(rows):
+    # rows of (identityid, *counts) grouped by identity, spreads each count over the identity's colors
+    totals = {c: None for c in list(STAT_BITS) + ['c']}
+    for identityid, *counts in rows:
+        colors = stat_colors(identityid)
+        if colors is None:
+            continue
+        for c in colors:
+            totals[c] = [a + b for a, b in zip(totals[c], counts)] if totals[c] else list(counts)
+    width = len(rows[0]) - 1 if rows else 0
+    return {c: v or [0] * width for c, v in totals.items()}
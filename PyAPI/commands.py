@@ -0,0 +1,79 @@
+import click
+import datetime
+from catalog import import_bulk_file
+from changes import prune_changelog
+from jobs import executor, resume_job, stale_jobs
+from legality import propagate_banlist
+from migrations import upgrade, current_version
+from migrations.explain import check_hot_queries
+from rollups import rebuild_rollups
+from models import db
+from main import app
+
+@app.cli.command('import-bulk')
+@click.argument('path')
+@click.option('--batch-size', default=1000, help='Scryfall objects per commit')
+def import_bulk_command(path, batch_size):
+    # load a scryfall bulk data file (default_cards recommended so token parts resolve) into the local catalog
+    stats = import_bulk_file(path, batch_size=batch_size, log=click.echo)
+    click.echo(f"Imported {stats['cards']} new cards, {stats['printings']} new printings and {stats['tokens']} new card tokens from {stats['objects']} objects")
+
+@app.cli.command('init-db')
+def init_db_command():
+    # creates any tables from models.py that dont exist yet, existing tables are left alone, then applies the
+    # migrations so the version triggers and anything else create_all cant express are in place
+    db.create_all()
+    upgrade(log=click.echo)
+    click.echo(f'Database tables created, schema is at version {current_version()}')
+
+@app.cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this migration number')
+def db_upgrade_command(target):
+    # applies any migrations in migrations/ newer than the recorded schema version
+    applied = upgrade(target=target, log=click.echo)
+    click.echo(f'Applied {len(applied)} migrations, schema is at version {current_version()}')
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    # confirms the hot lookups are served by indexes, exits non zero if any fall back to a scan
+    failed = 0
+    for name, ok, plan in check_hot_queries():
+        click.echo(f"{'ok  ' if ok else 'SCAN'} {name}: {plan}")
+        failed += not ok
+    if failed:
+        raise click.ClickException(f'{failed} queries are not using an index')
+
+@app.cli.command('resume-jobs')
+@click.option('--lease-minutes', default=15, help='Only jobs untouched for this long are taken as abandoned')
+def resume_jobs_command(lease_minutes):
+    # jobs left queued or running by a dead process are rerun from their last checkpoint, ones still being
+    # checkpointed by a live worker are skipped
+    resumed = [job for job in stale_jobs(datetime.timedelta(minutes=lease_minutes)) if resume_job(app, job)]
+    executor.shutdown(wait=True)
+    click.echo(f'Resumed {len(resumed)} jobs')
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    # recomputes every user's stats rollup rows from the performance history
+    count = rebuild_rollups()
+    click.echo(f'Rebuilt {count} rollup rows')
+
+@app.cli.command('prune-changelog')
+@click.option('--days', default=90, help='Keep this many days of changes')
+def prune_changelog_command(days):
+    # clients holding a cursor older than what is kept get a full dump on their next sync
+    count = prune_changelog(datetime.datetime.utcnow() - datetime.timedelta(days=days))
+    click.echo(f'Removed {count} changelog entries')
+
+@app.cli.command('propagate-banlist')
+@click.argument('cardids', nargs=-1, required=True)
+@click.option('--batch-size', default=500, help='Decks rechecked per commit')
+def propagate_banlist_command(cardids, batch_size):
+    # rechecks stored legality of the decks containing these cards after their banned flag changed
+    checked = legal = illegal = 0
+    for last, count, nowlegal, nowillegal in propagate_banlist(cardids, batch_size=batch_size):
+        db.session.commit()
+        checked += count
+        legal += len(nowlegal)
+        illegal += len(nowillegal)
+    click.echo(f'Checked {checked} decks, {legal} became legal and {illegal} became illegal')
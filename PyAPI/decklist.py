@@ -0,0 +1,65 @@
+import re
+from dataclasses import dataclass
+
+# group 1: count
+# group 2: cardname
+# group 3: commander flag
+OLD_DECKLINE_REGEX = re.compile(r'^(\d+x?) *([^\(\n\*]+) *(?:\(.*\))? *(?:[\d]+|\w\w\w-\d+)? *(\*CMDR\*)?')
+DECKLINE_REGEX = re.compile(r'^(\d+x?)? *([^\(\n\*]+) *(?:\(.*\))? *(?:[\d]+|\w\w\w-\d+)? *(\*CMDR\*)?')
+COUNT_REGEX = re.compile(r'[^0-9]')
+
+@dataclass
+class DecklistEntry:
+    count: int
+    name: str
+    section: str
+    commander: bool
+    line: str
+
+    @property
+    def companion(self):
+        return self.section == 'companion'
+
+    @property
+    def sideboard(self):
+        # companions sit in the sideboard
+        return self.section in ('companion', 'sideboard')
+
+def line_regex(text):
+    # lists exported in the old format start with an "oldregex" line, counts are required there
+    return OLD_DECKLINE_REGEX if text.split('\n', 1)[0] == 'oldregex' else DECKLINE_REGEX
+
+def section_for(line):
+    lower = line.lower()
+    if 'commander' in lower:
+        return 'commander'
+    if 'companion' in lower:
+        return 'companion'
+    if 'sideboard' in lower:
+        return 'sideboard'
+    return 'main'
+
+def iter_lines(text):
+    # yields (line, entry) for every line of a pasted list, entry is None for lines that arent cards,
+    # those are section headers and switch the section for the cards after them
+    regex = line_regex(text)
+    section = 'main'
+    for line in text.split('\n'):
+        parsed = regex.search(line)
+        if not parsed:
+            section = section_for(line)
+            yield line, None
+            continue
+        count = parsed.group(1)
+        yield line, DecklistEntry(
+            count=int(COUNT_REGEX.sub('', count)) if count else 1,
+            name=parsed.group(2).strip(),
+            section=section,
+            commander=section == 'commander' or bool(parsed.group(3)),
+            line=line,
+        )
+
+def iter_decklist(text):
+    for line, entry in iter_lines(text):
+        if entry:
+            yield entry
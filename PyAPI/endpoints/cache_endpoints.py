@@ -0,0 +1,12 @@
+from flask import jsonify
+from caching import CACHES
+from main import app, limiter, token_required
+
+@app.route('/caches', methods=['GET'])
+@token_required
+@limiter.limit('')
+def get_cache_stats(current_user):
+    if not current_user.admin:
+        return jsonify({'message' : 'Lacking Permissions'})
+
+    return jsonify({name: cache.stats() for name, cache in CACHES.items()})
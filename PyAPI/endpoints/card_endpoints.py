@@ -1,15 +1,15 @@
-import json
-import re
-import time
 from flask import request, jsonify
-import requests
 from sqlalchemy.orm import aliased
-from helpers import scryfall_color_converter
+from cardnames import cards_for_names
+from decklist import iter_decklist
+from catalog import fetch_card_tokens
+from jobs import job_handler, submit_job
 from models import Card, Cardtoken, Printing, Printfavorite
+from caching import conditional
 from main import app, limiter, token_required, db
-
-OLD_DECKLINE_REGEX = r'^(\d+x?) *([^\(\n\*]+) *(?:\(.*\))? *(?:[\d]+|\w\w\w-\d+)? *(\*CMDR\*)?'
-DECKLINE_REGEX = r'^(\d+x?)? *([^\(\n\*]+) *(?:\(.*\))? *(?:[\d]+|\w\w\w-\d+)? *(\*CMDR\*)?'
+from scryfall import get_client
+from changes import touch_decks
+from tts import favorite_decks
 
 @app.route('/card/<id>', methods=['GET'])
 @token_required
@@ -23,6 +23,7 @@ def get_card(current_user, id):
 
 @app.route('/banlist', methods=['GET'])
 @limiter.limit('')
+@conditional('card')
 def get_banlist():
     banlist = Card.query.filter_by(banned=1).all()
     if not banlist:
@@ -30,8 +31,33 @@ def get_banlist():
         
     return jsonify(banlist)
 
+@app.route('/banlist', methods=['PUT'])
+@token_required
+@limiter.limit('')
+def update_banlist(current_user):
+    if not current_user.admin:
+        return jsonify({'message' : 'Lacking Permissions'})
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('banned'), bool) or not isinstance(data.get('cardids'), list) \
+            or not all(isinstance(c, str) for c in data['cardids']):
+        return jsonify({'message' : 'Invalid data provided!'}), 400
+    banned = data['banned']
+    cards = Card.query.filter(Card.id.in_(data['cardids'])).all()
+    changed = [c.id for c in cards if bool(c.banned) != banned]
+    if not changed:
+        return jsonify({'message' : 'Banlist unchanged'})
+    for c in cards:
+        c.banned = banned
+    db.session.commit()
+
+    # stored deck legality is brought up to date in the background, poll /job/<id> for the counts
+    job = submit_job(app, 'banlist', {'cardids': changed}, current_user.id)
+    return jsonify({'message' : 'Banlist updated', 'cards': changed, 'jobid': job.id}), 202
+
 @app.route('/watchlist', methods=['GET'])
 @limiter.limit('')
+@conditional('card')
 def get_watchlist():
     watchlist = Card.query.filter_by(watchlist=1).all()
     if not watchlist:
@@ -46,28 +72,11 @@ def cards_from_decklist(current_user):
     list = request.get_json() # data passed in is just decklist
     cards = []
 
-    SELECTED_REGEX = DECKLINE_REGEX if list.split('\n')[0] != "oldregex" else OLD_DECKLINE_REGEX
-
-    #iterate list
-    for lin in list.split('\n'):
-        #for each line we need to check if its a card or section identifier then handle appropriately
-        cardparseinfo = re.search(SELECTED_REGEX, lin)
-        # group 1: count
-        # group 2: cardname
-        # group 3: commander flag
-        
-        if not cardparseinfo:
-            continue
-        #try to get from db first
-        dbcard = Card.query.filter_by(name=(cardparseinfo.group(2).rstrip().lstrip())).first()
-        print(dbcard)
-        
-        # if we dont find the cardname in our db we fetch from scryfall
-        # NOTE: this will also happen sometimes when we have the cardname but it doesnt properly match
-        if dbcard:
-            print(dbcard)
-            cards.append(dbcard)
-        
+    names = [e.name for e in iter_decklist(list)]
+    dbcards = cards_for_names(set(names))
+    for name in names:
+        if name in dbcards:
+            cards.append(dbcards[name])
 
     return jsonify(cards)
 
@@ -80,57 +89,36 @@ def cards_from_decklist(current_user):
 @token_required
 @limiter.limit('')
 def add_all_tokens(current_user):
+    # runs as a background job, poll /job/<id> for progress
+    job = submit_job(app, 'bulktokens', {}, current_user.id)
+    return jsonify({'message' : 'Token refresh queued', 'jobid': job.id}), 202
+
+@job_handler('bulktokens')
+def bulktokens_job(ctx):
+    client = get_client(app)
     seenTokens = set()
-    realCards = Card.query.filter_by(custom = None).all()
-    print(f"{len(realCards)} cards found")
-    counter = 0
-    for card in realCards:
-        counter += 1
-        print(f"{counter} / {len(realCards)} - {card.name} {card.id}")
-        if card.id.endswith("/back"):
-            continue
-        cardinfo = requests.get(url="https://api.scryfall.com/cards/search?q=oracleid=" + card.id).content
-        time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-        rp = json.loads(cardinfo)
-        if rp:
-            if 'all_parts' not in rp['data'][0]:
-                continue
-            print(f'Found parts {card.name} {card.id}')
-            for c in rp["data"][0]["all_parts"]:
-                if c["component"] == "token" or c['type_line'].startswith('Emblem'):
-                    print(f'Found token {c["name"]} {card.name} {card.id}')
-                    tokenInfo = requests.get(url=c["uri"]).content
-                    time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-                    ti = json.loads(tokenInfo)
-                    if "oracle_id" in ti:
-                        print(f'Getting token for {card.name} {card.id}')
-                        dbtoken = Cardtoken(cardid=card.id, tokenid=ti["oracle_id"]) 
-                        db.session.add(dbtoken)
-                        if ti["oracle_id"] in seenTokens:
-                            print(f'Already retrieved printings for {ti["name"]} {ti["oracle_id"]}')
-                            continue
-                        seenTokens.add(ti["oracle_id"])
-                        tokenPrintings = requests.get(url="https://api.scryfall.com/cards/search?q=oracleid=" + ti["oracle_id"] + "&unique=prints").content
-                        time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-                        tp = json.loads(tokenPrintings)
-                        if tp:
-                            for p in tp["data"]:
-                                existingPrint = Printing.query.filter_by(id=p["id"]).first()
-                                if not existingPrint:
-                                    print(f'Getting adding print for {ti["name"]} {ti["oracle_id"]}')
-                                    if "image_uris" in p:
-                                        print("once face " + p["id"])
-                                        new_printing = Printing(id=p["id"], cardid=ti["oracle_id"], cardimage=p["image_uris"]["large"], artcrop=p["image_uris"]["art_crop"])
-                                        db.session.add(new_printing)
-                                    else:
-                                        print("two face")
-                                        new_printing_front = Printing(id=p["id"], cardid=ti["oracle_id"], cardimage=p["card_faces"][0]["image_uris"]["large"], artcrop=p["card_faces"][0]["image_uris"]["art_crop"])
-                                        db.session.add(new_printing_front)
-                                        new_printing_back = Printing(id=(p["id"]+"/back"), cardid=(ti["oracle_id"]+"/back"), cardimage=p["card_faces"][1]["image_uris"]["large"], artcrop=p["card_faces"][1]["image_uris"]["art_crop"])
-                                        db.session.add(new_printing_back)
-    db.session.commit()
+    q = Card.query.filter_by(custom = None)
+    if ctx.job.total is None:
+        ctx.set_total(q.count())
+    # cards are walked in id order so the checkpoint is just the last id we finished
+    last = ctx.checkpoint_data.get('last')
+    progress = ctx.job.progress or 0
+    added = ctx.checkpoint_data.get('added', {'tokens': 0, 'printings': 0})
+    while True:
+        bq = q.order_by(Card.id)
+        if last is not None:
+            bq = bq.filter(Card.id > last)
+        batch = bq.limit(50).all()
+        if not batch:
+            break
+        found = fetch_card_tokens(batch, client, seenTokens)
+        added['tokens'] += found['tokens']
+        added['printings'] += found['printings']
+        last = batch[-1].id
+        progress += len(batch)
+        ctx.checkpoint({'last': last, 'added': added}, progress)
 
-    return jsonify()
+    return added
 
 
 # TODO: Adding art fetching
@@ -162,6 +150,7 @@ def update_printfavorite(current_user):
     if not 'print' in data or data['print'] == '':
         if printfavorite:
             db.session.delete(printfavorite)
+            touch_decks(favorite_decks(current_user.id, data['card']))
             db.session.commit()
         return jsonify({'message' : 'Removed Favorite'})
     
@@ -171,6 +160,8 @@ def update_printfavorite(current_user):
     else:
         new_favorite = Printfavorite(userid=current_user.id, cardid=data['card'], printingid=data['print'])
         db.session.add(new_favorite)
+    # the tts exports of this user's decks pick up the new art through their version, lastupdated is left alone
+    touch_decks(favorite_decks(current_user.id, data['card']))
     db.session.commit()
         
     return jsonify({'message' : 'Updated Favorite'})
\ No newline at end of file
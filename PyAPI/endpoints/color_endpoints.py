@@ -1,9 +1,11 @@
 from flask import jsonify
 from models import Coloridentity
+from caching import conditional
 from main import app, limiter
 
 @app.route('/colors', methods=['GET'])
 @limiter.limit('')
+@conditional('coloridentity')
 def get_coloridentities():
     colors = Coloridentity.query.all()
     return jsonify(colors)
\ No newline at end of file
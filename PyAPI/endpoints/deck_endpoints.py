@@ -1,19 +1,19 @@
 from flask import request, jsonify
+from sqlalchemy import insert, select, literal, exists, func
 from sqlalchemy.orm import aliased
-import requests, time, json
-import re
 import datetime
-from helpers import scryfall_color_converter
-from models import Cardtoken, Printfavorite, User, Card, Deck, Decklist, Performance, Coloridentity, Printing
+from dataclasses import asdict
+from models import Cardtoken, User, Card, Deck, Decklist, Performance, Printing
 from main import app, limiter, token_required, db
-from urllib.parse import quote
-
-OLD_DECKLINE_REGEX = r'^(\d+x?) *([^\(\n\*]+) *(?:\(.*\))? *(?:[\d]+|\w\w\w-\d+)? *(\*CMDR\*)?'
-DECKLINE_REGEX = r'^(\d+x?)? *([^\(\n\*]+) *(?:\(.*\))? *(?:[\d]+|\w\w\w-\d+)? *(\*CMDR\*)?'
-
-headers = {
-    'User-Agent': 'RumbleMTG/1.0 (contact: antraiti@github)'
-}
+from jobs import job_handler, submit_job
+from rollups import rebuild_rollups, users_for_decks
+from colors import merge_identities, mask_for_id
+from cardnames import cards_for_names
+from decklist import iter_decklist, iter_lines
+from legality import deck_legality, evaluate_legality, affected_decks, propagate_banlist
+from tts import build_tts_export, tts_cache, tts_cache_key
+from caching import LRUCache, conditional
+from changes import table_versions, record_changes
 
 @app.route('/deck', methods=['POST'])
 @token_required
@@ -71,12 +71,17 @@ def update_deck(current_user):
         deck.companion = data['companion']
     if 'power' in data:
         deck.power = data['power']
+    identitychanged = 'identityid' in data and data['identityid'] != deck.identityid
     if 'identityid' in data:
         deck.identityid = data['identityid']
     
     deck.lastupdated = datetime.datetime.now()
+    deck.version = Deck.version + 1
 
     db.session.commit()
+    forget_deck(deck.id)
+    if identitychanged:
+        rebuild_rollups(users_for_decks([deck.id]))
     return jsonify({'message' : 'Updated deck'})
 
 @app.route('/deck', methods=['GET'])
@@ -128,191 +133,126 @@ def create_deck_v2(current_user):
     list = data['list']
     user = data['user'] if 'user' in data else current_user.id
 
-    #commit deck first to use id later
+    # big pastes can be handed to the job runner, poll /job/<id> for the deckid
+    if data.get('background'):
+        job = submit_job(app, 'deckimport', {'name': name, 'list': list, 'user': user}, current_user.id)
+        return jsonify({'message' : 'Deck import queued', 'jobid': job.id}), 202
+
+    deckid = import_decklist(name, list, user)
+    return jsonify({'message' : 'New deck created', 'deckid': deckid})
+
+@job_handler('deckimport')
+def deckimport_job(ctx):
+    # the checkpoint naming the deck commits with the deck itself, a resumed job hands that deck back instead of importing again
+    deckid = ctx.checkpoint_data.get('deckid')
+    if deckid is None:
+        ctx.set_total(1)
+        deckid = import_decklist(ctx.params['name'], ctx.params['list'], ctx.params['user'], lambda id: ctx.checkpoint({'deckid': id}, 1, commit=False))
+    return {'deckid': deckid}
+
+def import_decklist(name, text, user, before_commit=None):
+    entries = list(iter_decklist(text))
+
+    # resolve every name at once, cards are only taken from the local catalog (see flask import-bulk)
+    dbcards = cards_for_names({e.name for e in entries})
+
+    # flush rather than commit so the whole import is one transaction
     new_deck = Deck(name=name, userid=user, identityid=1, lastupdated=datetime.datetime.now())
     db.session.add(new_deck)
-    db.session.commit()
-
-    commanderRegion = False
-    companionRegion = False
-    sideboardRegion = False
-    skip = False
+    db.session.flush()
 
-    SELECTED_REGEX = DECKLINE_REGEX if list.split('\n')[0] != "oldregex" else OLD_DECKLINE_REGEX
+    listentries = []
+    legalityrows = []
+    for e in entries:
+        dbcard = dbcards.get(e.name)
+        if not dbcard:
+            print(e.name + " NOT FOUND")
+            continue
 
-    splitLines = list.split('\n')
-    counter = 0
-    for lin in splitLines:
-        counter += 1
         commander = False
         companion = False
-        sideboard = False
-        skip = False
-        #for each line we need to check if its a card or section identifier then handle appropriately
-        cardparseinfo = re.search(SELECTED_REGEX, lin)
-        # group 1: count
-        # group 2: cardname
-        # group 3: commander flag
-        if not cardparseinfo:
-            print("COULD NOT PARSE LINE: " + lin)
-            if "commander" in lin.lower():
-                print("COMMADNERL: " + lin)
-                commanderRegion = True
-                companionRegion = False
-                sideboardRegion = False
-            elif "companion" in lin.lower():
-                print("COMPANIONL: " + lin)
-                commanderRegion = False
-                companionRegion = True
-                sideboardRegion = True
-            elif "sideboard" in lin.lower():
-                print("SIDEBOARDL: " + lin)
-                commanderRegion = False
-                companionRegion = False
-                sideboardRegion = True
+        #add the card entry to deck if relevant (commander etc) and decklist entry
+        if e.commander:
+            commander = True
+            if not new_deck.commander:
+                new_deck.commander = dbcard.id
+                new_deck.identityid = dbcard.identityid
             else:
-                commanderRegion = False
-                companionRegion = False
-                sideboardRegion = False
-            skip = True
-            continue
-
-        #try to get from db first
-        dbcard = Card.query.filter_by(name=(cardparseinfo.group(2).rstrip().lstrip())).first()
-        
-        # if we dont find the cardname in our db we fetch from scryfall
-        # NOTE: this will also happen sometimes when we have the cardname but it doesnt properly match
-        if not dbcard:
-            #here we query scryfall for the info
-            req = requests.get(url="https://api.scryfall.com/cards/named?exact=" + quote(cardparseinfo.group(2)), data=data, headers=headers).content
-            time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-            r = json.loads(req)
-            print("FETCHED " + cardparseinfo.group(2))
-            
-            if 'oracle_id' not in r or r['set_type'] == "token":
-                #means card no exist probably because its a line defining a card type
-                print(cardparseinfo.group(2) + " NOT FOUND")
-                skip = True
-                continue
-            
-            dbcard = Card.query.filter_by(id=r['oracle_id']).first() #sanity check because sometimes it trys to add things that exist
-            if not dbcard:
-                if "card_faces" in r and not 'Adventure' in r['type_line']:
-                    frontcard = r['card_faces'][0]
-                    dbcard = Card(id=r['oracle_id'], name=r['name'], typeline=r['type_line'], oracletext=frontcard['oracle_text'], mv=r['cmc'], cost=frontcard['mana_cost'], identityid=scryfall_color_converter(r['color_identity']), transform=True)
-                    backcard = r['card_faces'][1]
-                    backdbcard = Card(id=(r['oracle_id'] + "/back"), name=backcard['name'], typeline=backcard['type_line'], oracletext=backcard['oracle_text'], mv=r['cmc'], cost=backcard['mana_cost'], identityid=scryfall_color_converter(r['color_identity']), transform=True)
-                    db.session.add(backdbcard)
-                else:
-                    dbcard = Card(id=r['oracle_id'], name=r['name'], typeline=r['type_line'], oracletext=r['oracle_text'], mv=r['cmc'], cost=(r['mana_cost']), identityid=scryfall_color_converter(r['color_identity'])) 
-                db.session.add(dbcard)
-                if "all_parts" in r:
-                    for c in r["all_parts"]:
-                        if c["component"] == "token" or c['type_line'].startswith('Emblem'):
-                            tokenInfo = requests.get(url=c["uri"], headers=headers).content
-                            time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-                            ti = json.loads(tokenInfo)
-                            if "oracle_id" in ti:
-                                dbtoken = Cardtoken(cardid=r['oracle_id'], tokenid=ti["oracle_id"]) 
-                                db.session.add(dbtoken)
-                                printExisting = Printing.query.filter_by(cardid=r['oracle_id']).first()
-                                if printExisting is not None:
-                                    continue
-                                tokenPrintings = requests.get(url="https://api.scryfall.com/cards/search?q=oracleid=" + ti["oracle_id"] + "&unique=prints", headers=headers).content
-                                time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-                                tp = json.loads(tokenPrintings)
-                                if tp:
-                                    for p in tp["data"]:
-                                        existingPrint = Printing.query.filter_by(id=p["id"]).first()
-                                        if not existingPrint:
-                                            print(f'Getting adding print for {ti["name"]} {ti["oracle_id"]}')
-                                            if "image_uris" in p:
-                                                print("once face " + p["id"])
-                                                new_printing = Printing(id=p["id"], cardid=ti["oracle_id"], cardimage=p["image_uris"]["large"], artcrop=p["image_uris"]["art_crop"])
-                                                db.session.add(new_printing)
-                                            else:
-                                                print("two face")
-                                                new_printing_front = Printing(id=p["id"], cardid=ti["oracle_id"], cardimage=p["card_faces"][0]["image_uris"]["large"], artcrop=p["card_faces"][0]["image_uris"]["art_crop"])
-                                                db.session.add(new_printing_front)
-                                                new_printing_back = Printing(id=(p["id"]+"/back"), cardid=(ti["oracle_id"]+"/back"), cardimage=p["card_faces"][1]["image_uris"]["large"], artcrop=p["card_faces"][1]["image_uris"]["art_crop"])
-                                                db.session.add(new_printing_back)
-            db.session.commit()
-
-            if not Printing.query.filter_by(cardid=dbcard.id).first():
-                    print("adding prints")
-                    printreq = requests.get(url="https://api.scryfall.com/cards/search?q=oracleid=" + dbcard.id + "&unique=prints", headers=headers).content
-                    time.sleep(0.1) #in order to prevent timeouts we need to throttle to 100ms
-                    rp = json.loads(printreq)
-                    if rp:
-                        for p in rp["data"]:
-                            if "image_uris" in p or ('layout' in p and p['layout'] == 'adventure') or ('layout' in p and p['layout'] == 'prepared'):
-                                print("once face " + p["id"])
-                                new_printing = Printing(id=p["id"], cardid=dbcard.id, cardimage=p["image_uris"]["large"], artcrop=p["image_uris"]["art_crop"])
-                                db.session.add(new_printing)
-                            else:
-                                print("two face")
-                                new_printing_front = Printing(id=p["id"], cardid=dbcard.id, cardimage=p["card_faces"][0]["image_uris"]["large"], artcrop=p["card_faces"][0]["image_uris"]["art_crop"])
-                                db.session.add(new_printing_front)
-                                if (dbcard.transform):
-                                    new_printing_back = Printing(id=(p["id"]+"/back"), cardid=(dbcard.id+"/back"), cardimage=p["card_faces"][1]["image_uris"]["large"], artcrop=p["card_faces"][1]["image_uris"]["art_crop"])
-                                    db.session.add(new_printing_back)
-            db.session.commit()
-        else:
-            print("FOUND " + dbcard.name)
-        
-        if dbcard and not skip:
-            #add the card entry to deck if relevant (commander etc) and decklist entry
-            if commanderRegion or (cardparseinfo.group(3) and cardparseinfo.group(3).find('CMDR')):
-                print("CHOSEN COMMANDER")
-                if not new_deck.commander:
-                    print("CHOSEN COMMANDER 1")
-                    commander = True
-                    new_deck.commander = dbcard.id
-                    new_deck.identityid = dbcard.identityid
-                else:
-                    print("CHOSEN COMMANDER 2")
-                    new_deck.partner = dbcard.id
-                    commander = True
-                    color1 = Coloridentity.query.filter_by(id=new_deck.identityid).first()
-                    color2 = Coloridentity.query.filter_by(id=dbcard.identityid).first()
-                    final_color = Coloridentity.query.filter_by(
-                        green=(color1.green or color2.green),
-                        red=(color1.red or color2.red),
-                        blue=(color1.blue or color2.blue),
-                        black=(color1.black or color2.black),
-                        white=(color1.white or color2.white),
-                        ).first()
-                    new_deck.identityid = final_color.id
-            elif companionRegion:
-                companion = True
-                new_deck.companion = dbcard.id
-            
-            print("Adding " + dbcard.name)
-            cardcount = cardparseinfo.group(1)
-            
-            if not cardcount:
-                cardcount = 1
-            else:
-                cardcount = re.sub("[^0-9]", "", cardcount)
-            
-            new_listentry = Decklist(deckid=new_deck.id, cardid=dbcard.id, iscommander=commander, count=cardcount, iscompanion=companion, issideboard=sideboardRegion)
-            db.session.add(new_listentry)
-            db.session.commit()
-            new_deck.islegal = get_deck_legality(new_deck.id)['legal']
-            db.session.commit()
-
-    return jsonify({'message' : 'New deck created', 'deckid': new_deck.id})
+                new_deck.partner = dbcard.id
+                new_deck.identityid = merge_identities(new_deck.identityid, dbcard.identityid)
+        elif e.companion:
+            companion = True
+            new_deck.companion = dbcard.id
+
+        listentries.append({"deckid": new_deck.id, "cardid": dbcard.id, "iscommander": commander, "count": e.count, "iscompanion": companion, "issideboard": e.sideboard})
+        if mask_for_id(dbcard.identityid) is not None:
+            legalityrows.append((e.count, e.sideboard, dbcard.banned, dbcard.name))
+
+    if listentries:
+        db.session.execute(insert(Decklist), listentries)
+    # the rows are already in memory so legality needs no query here
+    new_deck.islegal = evaluate_legality(new_deck.commander, new_deck.companion, legalityrows)['legal']
+    new_deck.version = Deck.version + 1
+    if before_commit:
+        before_commit(new_deck.id)
+    db.session.commit()
+    return new_deck.id
+
+# deck id -> (stamp, json text) of the public deck page. the stamp is rebuilt from the database on every request so
+# edits made through any worker or cli command are seen, forget_deck only frees the entry in this worker
+deck_page_cache = LRUCache('deckpage', maxsize=512, ttl=600)
+custom_cards_cache = LRUCache('customcards', maxsize=1)
+
+def forget_deck(id):
+    deck_page_cache.pop(int(id))
+
+def deck_page_stamp(deck, catalog):
+    # only this deck's own state and the catalog versions it renders, its version moves with every list or performance change
+    latest = db.session.query(func.max(Performance.id)).filter(Performance.deckid==deck.id).scalar()
+    return (deck.version, latest) + tuple(v[0] for v in catalog)
+
+def custom_cards(version):
+    # every deck page sends the custom card list, it only changes when cards do
+    cached = custom_cards_cache.get('cards')
+    if cached is None or cached[0] != version:
+        cached = (version, [asdict(c) for c in Card.query.filter_by(custom=True).all()])
+        custom_cards_cache.set('cards', cached)
+    return cached[1]
+
+@job_handler('banlist')
+def banlist_job(ctx):
+    # only decks that list one of the changed cards are rechecked
+    cardids = ctx.params['cardids']
+    if ctx.job.total is None:
+        ctx.set_total(affected_decks(cardids).count())
+    progress = ctx.job.progress or 0
+    counts = ctx.checkpoint_data.get('counts', {'legal': 0, 'illegal': 0})
+    for last, checked, nowlegal, nowillegal in propagate_banlist(cardids, after=ctx.checkpoint_data.get('last')):
+        for id in nowlegal + nowillegal:
+            forget_deck(id)
+        counts['legal'] += len(nowlegal)
+        counts['illegal'] += len(nowillegal)
+        progress += checked
+        ctx.checkpoint({'last': last, 'counts': counts}, progress)
+    return {'checked': progress, 'legal': counts['legal'], 'illegal': counts['illegal']}
 
 @app.route('/deck/v2/<id>', methods=['GET'])
 #@token_required preventing for now
 @limiter.limit('')
 def get_deck_v2(id):
     deck = Deck.query.filter_by(id=id).first()
+    if not deck:
+        return jsonify({'message' : 'No decks found!'}), 204
+
+    catalog = table_versions('card', 'printing', 'cardtoken')
+    stamp = deck_page_stamp(deck, catalog)
+    cached = deck_page_cache.get(deck.id)
+    if cached is not None and cached[0] == stamp:
+        return app.response_class(cached[1], mimetype='application/json')
+
     cardlist = [tuple(row) for row in db.session.query(Decklist, Card).select_from(Decklist)\
                 .join(Card, Decklist.cardid==Card.id, isouter=True)\
                 .filter(Decklist.deckid == id).all()]
-    if not deck:
-        return jsonify({'message' : 'No decks found!'}), 204
     
     cardbacks = db.session.query(Card).filter(Card.id.in_((map(lambda x: (x[0].cardid+"/back"), cardlist)))).all()
 
@@ -325,83 +265,36 @@ def get_deck_v2(id):
     combMap = cardMap + backMap + tokenMap
     printings = db.session.query(Printing).filter(Printing.cardid.in_(combMap)).all()
 
-    customcards = Card.query.filter_by(custom=True).all()
-    legality = get_deck_legality(id)
+    legality = deck_legality(deck, catalog[0][0])
     
-    return jsonify({"deck": deck, "cardlist":cardlist, "legality": legality, "performances": performances, "printings": printings, "tokens": tokenMap, "customcards": customcards, "cardbacks": cardbacks})
+    body = app.json.dumps({"deck": deck, "cardlist":cardlist, "legality": legality, "performances": performances, "printings": printings, "tokens": tokenMap, "customcards": custom_cards(catalog[0][0]), "cardbacks": cardbacks})
+    deck_page_cache.set(deck.id, (stamp, body))
+    return app.response_class(body, mimetype='application/json')
 
 @app.route('/deck/tts/<id>', methods=['GET'])
 #@token_required preventing for now
 @limiter.limit('')
 def get_tts_deck(id):
     deck = Deck.query.filter_by(id=id).first()
-    cardlist = [tuple(row) for row in db.session.query(Decklist, Card).select_from(Decklist)\
-                .join(Card, Decklist.cardid==Card.id, isouter=True)\
-                .filter(Decklist.deckid == id).all()]
     if not deck:
         return jsonify({'message' : 'No decks found!'}), 204
-    
-    cardbacks = db.session.query(Card).filter(Card.id.in_((map(lambda x: (x[0].cardid+"/back"), cardlist)))).all()
 
-    tokens = db.session.query(Cardtoken).filter(Cardtoken.cardid.in_(map(lambda x: str(x[0].cardid),cardlist))).all()
+    key = tts_cache_key(deck)
+    body = tts_cache.get(key)
+    if body is None:
+        body = app.json.dumps(build_tts_export(deck))
+        tts_cache.set(key, body)
 
-    cardMap = list(map(lambda x: str(x[0].cardid),cardlist))
-    backMap = list(map(lambda x: x.id, cardbacks))
-    tokenMap = list(set(map(lambda x: x.tokenid, tokens)))
-    combMap = cardMap + backMap + tokenMap
-    printings = db.session.query(Printing).filter(Printing.cardid.in_(combMap)).all()
-    printFavorites = db.session.query(Printfavorite).filter(Printfavorite.userid == deck.userid).filter(Printing.cardid.in_(combMap)).all()
-
-    formattedCardlist = []
-    for c in cardlist:
-        frontFavorite = next((p for p in printFavorites if p.cardid == c[1].id),None)
-        printing = next((p for p in printings if p.id == frontFavorite.printingid), None) if frontFavorite is not None else next((p for p in printings if p.cardid == c[1].id), None)
-        backFavorite = next((p for p in printFavorites if p.cardid == (c[1].id + "/back")),None)
-        backPrinting = next((p for p in printings if p.id == backFavorite.printingid), None) if backFavorite is not None else next((p for p in printings if p.cardid == (c[1].id + "/back")), None)
-        if printing:
-            formattedCardlist.append({
-                "id": c[1].id,
-                "name": c[1].name,
-                "oracletext": c[1].oracletext,
-                "count": c[0].count,
-                "iscommander": c[0].iscommander,
-                "iscompanion": c[0].iscompanion,
-                "issideboard": c[0].issideboard,
-                "url": printing.cardimage,
-                "backurl": backPrinting.cardimage if backPrinting else None,
-            })
-        else:
-            formattedCardlist.append({
-                "id": c[1].id,
-                "name": c[1].name,
-                "oracletext": c[1].oracletext,
-                "count": c[0].count,
-                "iscommander": c[0].iscommander,
-                "iscompanion": c[0].iscompanion,
-                "issideboard": c[0].issideboard,
-                "url": "",
-                "backurl": ""
-            })
-    
-    formattedTokens = []
-    for t in tokenMap:
-        tokenPrinting = next((p for p in printings if p.cardid == t), None)
-        if tokenPrinting:
-            formattedTokens.append({
-                "id": t,
-                "url": tokenPrinting.cardimage
-            })
-        else:
-            formattedTokens.append({
-                "id": t,
-                "url": ""
-            })
+    return app.response_class(body, mimetype='application/json')
 
-    return jsonify({"deck": deck, "cardlist":formattedCardlist,"tokens": formattedTokens})
 
+def deck_version_stamp(id):
+    # every edit to the deck or its list bumps the version, so it stands in for the decklist
+    return db.session.query(Deck.version).filter(Deck.id==id).scalar()
 
 @app.route('/decklist/<id>', methods=['GET'])
 @limiter.limit('')
+@conditional('card', scope=deck_version_stamp)
 def get_decklist(id):
     deck = Deck.query.filter_by(id=id).first()
     cardlist = [tuple(row) for row in db.session.query(Decklist, Card).join(Card).filter(Decklist.deckid == id).all()]
@@ -410,6 +303,22 @@ def get_decklist(id):
     
     return jsonify({"deck": deck, "cardlist":cardlist})
 
+DECKLIST_COPY_FIELDS = ('deckid', 'cardid', 'iscommander', 'count', 'iscompanion', 'issideboard')
+
+def clone_deck(old_deck, userid):
+    # the list is copied inside the database with insert ... select, callers commit
+    new_deck = Deck(name=old_deck.name + " - Clone", userid=userid, identityid=old_deck.identityid, lastupdated=datetime.datetime.now(), commander=old_deck.commander, partner=old_deck.partner, companion=old_deck.companion, islegal=old_deck.islegal, image=old_deck.image)
+    db.session.add(new_deck)
+    db.session.flush()
+
+    # joining card keeps the old behaviour of dropping entries whose card no longer exists
+    rows = select(literal(new_deck.id), Decklist.cardid, Decklist.iscommander, Decklist.count, Decklist.iscompanion, Decklist.issideboard)\
+        .join(Card, Card.id==Decklist.cardid)\
+        .where(Decklist.deckid == old_deck.id)\
+        .order_by(Decklist.id)
+    db.session.execute(insert(Decklist).from_select(DECKLIST_COPY_FIELDS, rows))
+    return new_deck
+
 @app.route('/deck/<id>/steal', methods=['POST'])
 @token_required
 @limiter.limit('')
@@ -418,61 +327,35 @@ def steal_deck(current_user, id):
     old_deck = Deck.query.filter_by(id=id).first()
     if not old_deck:
         return jsonify({'message' : 'No decks found!'}), 204
-    
-    cardlist = [tuple(row) for row in db.session.query(Decklist, Card).join(Card).filter(Decklist.deckid == id).all()]
-    
-    # create new deck for user using old deck info
-    new_deck = Deck(name=old_deck.name + " - Clone", userid=current_user.id, identityid=old_deck.identityid, lastupdated=datetime.datetime.now(), commander=old_deck.commander, partner=old_deck.partner, companion=old_deck.companion, islegal=old_deck.islegal, image=old_deck.image)
-    db.session.add(new_deck)
+
+    new_deck = clone_deck(old_deck, current_user.id)
     db.session.commit()
-    
-    # 0 is decklist data
-    # 1 is card data
-    for c in cardlist:
-        new_listentry = Decklist(deckid=new_deck.id, cardid=c[1].id, iscommander=c[0].iscommander, count=c[0].count, iscompanion=c[0].iscompanion, issideboard=c[0].issideboard)
-        db.session.add(new_listentry)
-        db.session.commit()
 
     return jsonify({'message' : 'New deck created', 'deckid': new_deck.id})
 
+@app.route('/decks/clone', methods=['POST'])
+@token_required
+@limiter.limit('')
+def clone_decks(current_user):
+    # admin seeding for themed events, every deck is cloned to one user in a single transaction
+    if not current_user.admin:
+        return jsonify({'message' : 'Lacking Permissions'})
 
-#need to move this somewhere better
-def get_deck_legality(id):
-    deck = Deck.query.filter_by(id=id).first()
-    legal = True
-    messages = []
-    if not deck:
-        return jsonify({'message' : 'No decks found!'})
-    
-    if not deck.commander:
-        legal = False
-        messages.append('Missing commander')
-    
-    cards = db.session.query(Decklist, Card, Coloridentity).select_from(Decklist).join(Card).join(Coloridentity).filter(Decklist.deckid == id).all()
-    count = 0
-    sideboard_count = 0
-    for c in cards:
-        if c.Decklist.issideboard:
-            sideboard_count += c.Decklist.count
-        else:
-            count += c.Decklist.count
-        if c.Card.banned:
-            legal = False
-            messages.append('Contains banned card '+str(c.Card.name))
-    if deck.companion == 'e15504a7-2b67-4185-b916-172145f10b19': #yorion oracleid
-        if count != 80:
-            legal = False
-            messages.append('Invalid amount of cards. Expected 80, found '+str(count))
-    else:
-        if count != 60:
-            legal = False
-            messages.append('Invalid amount of cards. Expected 60, found '+str(count))
-    if sideboard_count and sideboard_count > 7:
-            legal = False
-            messages.append('Invalid amount of sideboard cards. Expected <= 7, found '+str(sideboard_count))
+    data = request.get_json()
+    if not data or not 'deckids' in data:
+        return jsonify({'message' : 'Incomplete data provided!'}), 204
+    userid = data['userid'] if 'userid' in data else current_user.id
+    if not User.query.filter_by(id=userid).first():
+        return jsonify({'message' : 'No user found!'}), 204
 
+    decks = Deck.query.filter(Deck.id.in_(data['deckids'])).order_by(Deck.id).all()
+    if not decks:
+        return jsonify({'message' : 'No decks found!'}), 204
+    clones = {old_deck.id: clone_deck(old_deck, userid).id for old_deck in decks}
+    db.session.commit()
+
+    return jsonify({'message' : 'Decks cloned', 'decks': clones})
 
-    return {"legal": legal, "messages": messages}
 
 @app.route('/deck/v2/<id>', methods=['PUT'])
 @token_required
@@ -489,6 +372,7 @@ def update_deck_v2(current_user, id):
     
     if not 'prop' in data or not 'val' in data:
         return jsonify({'message' : 'Incomplete data provided!'}), 204
+    oldidentity = deck.identityid
     
     if data['prop'] == 'commander':
         if(deck.commander):
@@ -505,16 +389,8 @@ def update_deck_v2(current_user, id):
                 cardinfo = Card.query.filter_by(id=cardentry.cardid).first()
                 deck.identityid = cardinfo.identityid
             else:
-                cardinfo = db.session.query(Card, Coloridentity).join(Coloridentity).filter(Card.id == cardentry.cardid).all()
-                cardinfo2 = db.session.query(Card, Coloridentity).join(Coloridentity).filter(Card.id == deck.partner).all()
-                final_color = Coloridentity.query.filter_by(
-                        green=(cardinfo[0].Coloridentity.green or cardinfo2[0].Coloridentity.green),
-                        red=(cardinfo[0].Coloridentity.red or cardinfo2[0].Coloridentity.red),
-                        blue=(cardinfo[0].Coloridentity.blue or cardinfo2[0].Coloridentity.blue),
-                        black=(cardinfo[0].Coloridentity.black or cardinfo2[0].Coloridentity.black),
-                        white=(cardinfo[0].Coloridentity.white or cardinfo2[0].Coloridentity.white),
-                        ).first()
-                deck.identityid = final_color.id
+                identities = dict(db.session.query(Card.id, Card.identityid).filter(Card.id.in_((cardentry.cardid, deck.partner))).all())
+                deck.identityid = merge_identities(identities.get(cardentry.cardid), identities.get(deck.partner))
             printing = Printing.query.filter_by(cardid=data['val']).first()
             if printing:
                 deck.image = printing.artcrop
@@ -535,16 +411,8 @@ def update_deck_v2(current_user, id):
                 cardinfo = Card.query.filter_by(id=cardentry.cardid).first()
                 deck.identityid = cardinfo.identityid
             else:
-                cardinfo = db.session.query(Card, Coloridentity).join(Coloridentity).filter(Card.id == cardentry.cardid).all()
-                cardinfo2 = db.session.query(Card, Coloridentity).join(Coloridentity).filter(Card.id == deck.commander).all()
-                final_color = Coloridentity.query.filter_by(
-                        green=(cardinfo[0].Coloridentity.green or cardinfo2[0].Coloridentity.green),
-                        red=(cardinfo[0].Coloridentity.red or cardinfo2[0].Coloridentity.red),
-                        blue=(cardinfo[0].Coloridentity.blue or cardinfo2[0].Coloridentity.blue),
-                        black=(cardinfo[0].Coloridentity.black or cardinfo2[0].Coloridentity.black),
-                        white=(cardinfo[0].Coloridentity.white or cardinfo2[0].Coloridentity.white),
-                        ).first()
-                deck.identityid = final_color.id
+                identities = dict(db.session.query(Card.id, Card.identityid).filter(Card.id.in_((cardentry.cardid, deck.commander))).all())
+                deck.identityid = merge_identities(identities.get(cardentry.cardid), identities.get(deck.commander))
     if data['prop'] == 'companion':
         if(deck.companion):
             oldcompanion = Decklist.query.filter_by(deckid=id).filter_by(cardid=deck.companion).first()
@@ -584,9 +452,15 @@ def update_deck_v2(current_user, id):
     if data['prop'] == 'image':
         deck.image = data['val']
     
-    legality = get_deck_legality(id)
+    legality = deck_legality(deck)
     deck.islegal = legality['legal']
+    deck.lastupdated = datetime.datetime.now()
+    deck.version = Deck.version + 1
     db.session.commit()
+    forget_deck(deck.id)
+    # played decks changing colors moves their stats between color rollups
+    if performances and deck.identityid != oldidentity:
+        rebuild_rollups(users_for_decks([deck.id]))
     return jsonify({'message' : 'Deck updated'})
 
 @app.route('/removedeck/<id>', methods=['PUT'])
@@ -604,48 +478,97 @@ def remove_deck(current_user, id):
     if deck.userid != current_user.id and not current_user.admin:
         return jsonify({'message' : 'Not authorized'}), 401
 
-    print("stage 2")
-    decklist = Decklist.query.filter_by(deckid = id).all()
-    for dlentry in decklist:
-        db.session.delete(dlentry)
-    db.session.commit()
-    print("stage 3")
-    print(deck)
-    db.session.delete(deck)
+    delete_decks([deck.id])
     db.session.commit()
+    forget_deck(id)
 
     return jsonify({'message' : 'Deck deleted'})
 
+def delete_decks(deckids):
+    # set based delete of decks and their lists, callers make sure the decks have no performances and commit
+    Decklist.query.filter(Decklist.deckid.in_(deckids)).delete(synchronize_session=False)
+    Deck.query.filter(Deck.id.in_(deckids)).delete(synchronize_session=False)
+    record_changes(Deck, deckids, deleted=True)
+
+@app.route('/decks/removeunused', methods=['PUT'])
+@token_required
+@limiter.limit('')
+def remove_unused_decks(current_user):
+    # admin cleanup, deletes decks that were never played from a list of ids and/or a user
+    if not current_user.admin:
+        return jsonify({'message' : 'Lacking Permissions'})
+
+    data = request.get_json()
+    if not data or not ('deckids' in data or 'userid' in data):
+        return jsonify({'message' : 'Incomplete data provided!'}), 204
+
+    q = db.session.query(Deck.id).filter(~exists().where(Performance.deckid==Deck.id))
+    if 'deckids' in data:
+        q = q.filter(Deck.id.in_(data['deckids']))
+    if 'userid' in data:
+        q = q.filter(Deck.userid==data['userid'])
+    deckids = [d.id for d in q.all()]
+    if not deckids:
+        return jsonify({'message' : 'No decks found!'}), 204
+
+    delete_decks(deckids)
+    db.session.commit()
+    for id in deckids:
+        forget_deck(id)
+
+    return jsonify({'message' : 'Decks deleted', 'deckids': deckids})
+
+def check_decklists(lists):
+    # names from every list are resolved together so a whole pod costs the same as one list
+    parsed = [list(iter_lines(l)) for l in lists]
+    dbcards = cards_for_names({entry.name for lines in parsed for lin, entry in lines if entry})
+    results = []
+    for lines in parsed:
+        output = ""
+        bannedCards = []
+        for lin, entry in lines:
+            if not entry:
+                output += ("COULD NOT PARSE LINE: " + lin)
+                continue
+            dbcard = dbcards.get(entry.name)
+            if dbcard:
+                if dbcard.banned:
+                    bannedCards.append(dbcard)
+            else:
+                output += ("NOT IN OUR DATABASE: " + lin)
+        results.append({'message' : output, "bannedCards": bannedCards})
+    return results
+
 @app.route('/checker', methods=['POST'])
 @limiter.limit('')
 def check_decklist():
     list = request.get_json() # data passed in is just decklist
-    output = ""
-    bannedCards = []
-
-    SELECTED_REGEX = DECKLINE_REGEX if list.split('\n')[0] != "oldregex" else OLD_DECKLINE_REGEX
-
-    #iterate list
-    for lin in list.split('\n'):
-        #for each line we need to check if its a card or section identifier then handle appropriately
-        cardparseinfo = re.search(SELECTED_REGEX, lin)
-        # group 1: count
-        # group 2: cardname
-        # group 3: commander flag
-        
-        if not cardparseinfo:
-            output += ("COULD NOT PARSE LINE: " + lin)
-            continue
+    return jsonify(check_decklists([list])[0])
 
-        #try to get from db first
-        dbcard = Card.query.filter_by(name=(cardparseinfo.group(2).rstrip().lstrip())).first()
-        
-        # if we dont find the cardname in our db we fetch from scryfall
-        # NOTE: this will also happen sometimes when we have the cardname but it doesnt properly match
-        if dbcard:
-            if dbcard.banned:
-                bannedCards.append(dbcard)
-        else:
-            output += ("NOT IN OUR DATABASE: " + lin)
+# a pod's worth of lists, anything bigger is refused before it gets parsed
+CHECKER_MAX_LISTS = 16
+CHECKER_MAX_LINES = 2000
+
+@app.route('/checker/bulk', methods=['POST'])
+@token_required
+@limiter.limit('10 per minute')
+def check_decklists_bulk(current_user):
+    # takes a json array of decklists or an object of name -> decklist, results come back in the same shape
+    data = request.get_json()
+    if isinstance(data, dict):
+        names = [n for n in data]
+        lists = [data[n] for n in names]
+    elif isinstance(data, list):
+        names = None
+        lists = data
+    else:
+        return jsonify({'message' : 'Incomplete data provided!'}), 204
+    if not all(isinstance(l, str) for l in lists):
+        return jsonify({'message' : 'Incomplete data provided!'}), 204
+    if len(lists) > CHECKER_MAX_LISTS or sum(l.count('\n') + 1 for l in lists) > CHECKER_MAX_LINES:
+        return jsonify({'message' : 'Too many decklists or lines, the limit is %d lists and %d lines' % (CHECKER_MAX_LISTS, CHECKER_MAX_LINES)}), 400
 
-    return jsonify({'message' : output, "bannedCards": bannedCards})
\ No newline at end of file
+    results = check_decklists(lists)
+    if names is None:
+        return jsonify(results)
+    return jsonify(dict(zip(names, results)))
@@ -2,7 +2,9 @@ from flask import request, jsonify
 import datetime
 from sqlalchemy.orm import aliased
 from models import User, Deck, Performance, Event, EventDetails, Match, MatchDetails, Theme, Card
+from caching import conditional
 from main import app, limiter, token_required, db
+from rollups import rebuild_rollups, users_for_event
 
 @app.route('/event', methods=['POST'])
 @token_required
@@ -56,21 +58,25 @@ def update_event(current_user):
     if not event:
         return jsonify({'message' : 'No event found!'})
     
-    if 'name' in event:
+    if 'name' in data:
         event.name = data['name']
     if 'time' in data:
         event.time = data['time']
+    themedchanged = 'themed' in data and data['themed'] != event.themed
     if 'themed' in data:
         event.themed = data['themed']
     if 'themeid' in data:
         event.themeid = data['themeid']
 
     db.session.commit()
+    if themedchanged:
+        rebuild_rollups(users_for_event(event.id))
     return jsonify({'message' : 'Updated event'})
 
 @app.route('/event', methods=['GET'])
 @token_required
 @limiter.limit('')
+@conditional('event', public=False)
 def get_events(current_user):
     events = Event.query.all()
     if not events:
@@ -89,17 +95,22 @@ def get_event_details(current_user, id):
     matches = Match.query.filter_by(eventid=id).all()
     theme = Theme.query.filter_by(id=event.themeid).first()
 
-    def matchperformance(m):
-        performances = Performance.query.filter_by(matchid=m.id).all()
-        for p in performances:
-            p.username = User.query.filter_by(id=p.userid).first().username
-            killedbyuser = User.query.filter_by(id=p.killedby).first()
-            if killedbyuser:
-                p.killedbyname = killedbyuser.username
-        return MatchDetails(match=m, performances=performances)
-    
-    matchdetails = list(map(matchperformance, matches))
-    
+    # every performance of the event in one query, names come from a single user lookup
+    performances = Performance.query.filter(Performance.matchid.in_([m.id for m in matches])).all() if matches else []
+    userids = {p.userid for p in performances} | {p.killedby for p in performances if p.killedby}
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(userids)).all()) if userids else {}
+
+    matchperformances = {}
+    for p in performances:
+        p.username = usernames.get(p.userid)
+        if p.killedby in usernames:
+            p.killedbyname = usernames[p.killedby]
+        matchperformances.setdefault(p.matchid, []).append(p)
+
+    matchdetails = [MatchDetails(match=m, performances=matchperformances.get(m.id, [])) for m in matches]
+
+    # only the decks played at this event
+    deckids = {p.deckid for p in performances if p.deckid}
     commandercard = aliased(Card)
     partnercard = aliased(Card)
     companioncard = aliased(Card)
@@ -107,14 +118,9 @@ def get_event_details(current_user, id):
                     .join(commandercard, Deck.commander==commandercard.id, isouter=True)\
                     .join(partnercard, Deck.partner==partnercard.id, isouter=True)\
                     .join(companioncard, Deck.companion==companioncard.id, isouter=True)\
-                    .all()]
+                    .filter(Deck.id.in_(deckids))\
+                    .all()] if deckids else []
 
-    if not matches:
-        matches = []
-    
-    if not decks:
-        decks = []
-    
     eventDetails = EventDetails(event=event, matches=matchdetails, decks=decks, theme=theme)
     
     return jsonify(eventDetails)
@@ -0,0 +1,48 @@
+from flask import jsonify
+from models import Job
+from main import app, limiter, token_required
+from jobs import resume_job
+
+@app.route('/job/<id>', methods=['GET'])
+@token_required
+@limiter.limit('')
+def get_job(current_user, id):
+    job = Job.query.filter_by(id=id).first()
+    if not job:
+        return jsonify({'message' : 'No job found!'}), 204
+
+    if job.userid != current_user.id and not current_user.admin:
+        return jsonify({'message' : 'Not authorized'}), 401
+
+    return jsonify(job)
+
+@app.route('/jobs', methods=['GET'])
+@token_required
+@limiter.limit('')
+def get_jobs(current_user):
+    q = Job.query
+    if not current_user.admin:
+        q = q.filter_by(userid=current_user.id)
+    jobs = q.order_by(Job.id.desc()).limit(50).all()
+    if not jobs:
+        return jsonify({'message' : 'No jobs found!'}), 204
+
+    return jsonify(jobs)
+
+@app.route('/job/<id>/resume', methods=['POST'])
+@token_required
+@limiter.limit('')
+def resume_failed_job(current_user, id):
+    job = Job.query.filter_by(id=id).first()
+    if not job:
+        return jsonify({'message' : 'No job found!'}), 204
+
+    if job.userid != current_user.id and not current_user.admin:
+        return jsonify({'message' : 'Not authorized'}), 401
+
+    # running or queued jobs after a restart are picked up by flask resume-jobs instead
+    if job.status != 'failed':
+        return jsonify({'message' : 'Only failed jobs can be resumed'})
+
+    resume_job(app, job)
+    return jsonify({'message' : 'Job resumed', 'jobid': job.id})
@@ -2,6 +2,8 @@ import datetime, random
 from flask import request, jsonify
 from models import Performance, Match
 from main import app, limiter, token_required, db
+from changes import record_changes, touch_decks
+from rollups import apply_contribution, match_contributions
 
 @app.route('/match', methods=['POST'])
 @token_required
@@ -40,15 +42,19 @@ def update_match(current_user):
             performances = Performance.query.filter_by(matchid=matchid).all()
             if performances:
                 performances[random.randint(0, len(performances)-1)].order = 1
+                touch_decks([p.deckid for p in performances])
         if data['prop'] == 'end':
             match.end = datetime.datetime.utcnow()
         if data['prop'] == 'delete':
             if not match.start: #can only delete if we havent started the match for safety reasons
-                performances = Performance.query.filter_by(matchid=matchid).all()
+                for contribution in match_contributions(matchid):
+                    apply_contribution(contribution, -1)
+                # performances go in one statement, the whole delete commits together below
+                performances = db.session.query(Performance.id, Performance.deckid).filter_by(matchid=matchid).all()
                 if performances:
-                    for p in performances:
-                        db.session.delete(p)
-                        db.session.commit()
+                    Performance.query.filter_by(matchid=matchid).delete(synchronize_session=False)
+                    record_changes(Performance, [p.id for p in performances], deleted=True)
+                    touch_decks([p.deckid for p in performances])
                 db.session.delete(match)
         if data['prop'] == 'Normal':
             match.power = 0
@@ -0,0 +1,8 @@
+from metrics import render
+from main import app, limiter
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def get_metrics():
+    # scraped by prometheus, kept out of the rate limit so scrapes never get refused
+    return app.response_class(render(), mimetype='text/plain; version=0.0.4')
@@ -2,6 +2,8 @@ from flask import request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from models import User, Performance, Match
 from main import app, limiter, token_required, db
+from rollups import performance_contribution, update_rollups
+from changes import touch_decks
 
 @app.route('/performance', methods=['POST'])
 @token_required
@@ -32,6 +34,9 @@ def update_performance(current_user):
     performance = Performance.query.filter_by(id=data['id']).first()
     if not performance:
         return jsonify({'message' : 'No performance found!'})
+    oldrollup = performance_contribution(performance)
+    olddeckid = performance.deckid
+    deleted = False
     
     if 'placement' in data:
         performance.placement = data['placement']
@@ -53,7 +58,11 @@ def update_performance(current_user):
         match = Match.query.filter_by(id=performance.matchid).first()
         if not match.start:
             db.session.delete(performance)
+            deleted = True
 
+    # keep the stats rollups in step with placement and deck changes
+    update_rollups(oldrollup, None if deleted else performance_contribution(performance))
+    touch_decks([olddeckid, None if deleted else performance.deckid])
     db.session.commit()
     return jsonify({'message' : 'Updated performance'})
 
@@ -1,29 +1,15 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from sqlalchemy.orm import aliased
 import requests, time, json
 import re
 import datetime
-from dataclasses import dataclass, asdict
 from helpers import scryfall_color_converter
-from models import User, Card, Deck, Decklist, Performance, Coloridentity, Match, Event, Printing
+from models import User, Card, Deck, Decklist, Performance, Match, Printing, Statrollup
+from rollups import ROLLUP_COLORS
+from changes import current_cursor, oldest_cursor, changed_since, table_versions
+from aggregates import themed_filters, color_totals, color_winrates, finished_match_totals, card_performance_totals, card_stats, parse_date_arg, as_int
 from main import app, limiter, token_required, db
 
-@dataclass
-class colorstruct:
-    blue: float
-    red: float
-    green: float
-    white: float
-    black: float
-    colorless: float
-
-    blue = 0
-    red = 0
-    green = 0
-    white = 0
-    black = 0
-    colorless = 0
-
 @app.route('/stats/user/<id>/simple', methods=['GET'])
 @token_required
 @limiter.limit('')
@@ -33,64 +19,34 @@ def get_user_stats(current_user, id):
     if not user:
         return jsonify({'message' : 'No user found!'}), 204
     
-    q = db.session.query(Performance, Deck, Coloridentity) \
-        .join(Match, Match.id==Performance.matchid) \
-        .join(Event, Event.id==Match.eventid)
-    
+    # served from the rollup table kept up to date by performance edits (see rollups.py)
+    q = Statrollup.query.filter_by(userid=user.id)
     if not includethemed or includethemed != "true":
-        q = q.filter(Event.themed==False)
-    
-    performances = q.filter(Performance.userid == user.id) \
-        .filter(Deck.id==Performance.deckid) \
-        .filter(Coloridentity.id==Deck.identityid).all()
-    
-
-    matches_played = 0
-    matches_won = 0
+        q = q.filter_by(themed=False)
+
+    playcounts = dict.fromkeys(ROLLUP_COLORS, 0)
+    wincounts = dict.fromkeys(ROLLUP_COLORS, 0)
+    placementtotal = 0
+    for r in q.all():
+        playcounts[r.color] += r.plays
+        wincounts[r.color] += r.wins
+        if r.color == 'all':
+            placementtotal += r.placementtotal
+
+    matches_played = playcounts['all']
+    matches_won = wincounts['all']
     average_placement = 0
-    color_playcounts = colorstruct()
-    color_winrates = colorstruct()
-
-    for p in performances:
-        if p[0].placement == None:
-            continue
-        if p[0].placement == 1:
-            matches_won += 1
-            color_winrates.blue += p[2].blue
-            color_winrates.red += p[2].red
-            color_winrates.green += p[2].green
-            color_winrates.black += p[2].black
-            color_winrates.white += p[2].white
-            color_winrates.colorless += p[1].identityid == 1
-        color_playcounts.blue += p[2].blue
-        color_playcounts.red += p[2].red
-        color_playcounts.green += p[2].green
-        color_playcounts.black += p[2].black
-        color_playcounts.white += p[2].white
-        color_playcounts.colorless += p[1].identityid == 1
-        matches_played += 1
-        average_placement += p[0].placement
-
     if matches_played > 0:
-        average_placement = average_placement/matches_played
-    if color_playcounts.blue > 0:
-        color_winrates.blue /= color_playcounts.blue
-    if color_playcounts.red > 0:
-        color_winrates.red /= color_playcounts.red
-    if color_playcounts.green > 0:
-        color_winrates.green /= color_playcounts.green
-    if color_playcounts.black > 0:
-        color_winrates.black /= color_playcounts.black
-    if color_playcounts.white > 0:
-        color_winrates.white /= color_playcounts.white
-    if color_playcounts.colorless > 0:
-        color_winrates.colorless /= color_playcounts.colorless
-    
+        average_placement = placementtotal/matches_played
+    color_winrates = {}
+    for c in ('b', 'u', 'r', 'g', 'w', 'c'):
+        color_winrates[c] = wincounts[c]/playcounts[c] if playcounts[c] > 0 else wincounts[c]
+
     return jsonify({"matchesplayed": matches_played, 
                     "matcheswon": matches_won, 
                     "averageplacement": average_placement,
-                    "colorplaycount": {"b": color_playcounts.black, "u": color_playcounts.blue,"r": color_playcounts.red,"g": color_playcounts.green,"w": color_playcounts.white,"c": color_playcounts.colorless},
-                    "colorwinrates": {"b": color_winrates.black, "u": color_winrates.blue,"r": color_winrates.red,"g": color_winrates.green,"w": color_winrates.white,"c": color_winrates.colorless}})
+                    "colorplaycount": {c: playcounts[c] for c in ('b', 'u', 'r', 'g', 'w', 'c')},
+                    "colorwinrates": color_winrates})
 
 @app.route('/stats/global/simple', methods=['GET'])
 @token_required
@@ -98,154 +54,66 @@ def get_user_stats(current_user, id):
 def get_global_stats(current_user):
     includethemed = request.args.get('themed')
 
-    q = db.session.query(Performance, Deck, Coloridentity) \
-        .join(Match, Match.id==Performance.matchid) \
-        .join(Event, Event.id==Match.eventid)
-    
-    mq = db.session.query(Match).join(Event, Event.id==Match.eventid)
-    
-    if not includethemed or includethemed != "true":
-        q = q.filter(Event.themed==False)
-        mq = mq.filter(Event.themed==False)
-
-    performances = q.filter(Deck.id==Performance.deckid).filter(Coloridentity.id==Deck.identityid).all()
-    matches = mq.filter(Match.end!=None).all()
-
-    matches_played = 0
-    performance_count = 0
-    color_playcounts = colorstruct()
-    color_winrates = colorstruct()
-    matches_played = len(matches)
-    matchtime = 0
+    filters = themed_filters(includethemed)
 
-    for m in matches:
-        matchtime += ((m.end) - (m.start)).seconds
-    matchtime/=matches_played
+    # everything is summed and averaged in the database, only a couple of rows come back
+    matches_played, matchtime = finished_match_totals(*filters)
+    performance_count, color_playcounts, color_wins = color_totals(*filters)
 
-
-    for p in performances:
-        if p[0].placement == None:
-            continue
-        if p[0].placement == 1:
-            color_winrates.blue += p[2].blue
-            color_winrates.red += p[2].red
-            color_winrates.green += p[2].green
-            color_winrates.black += p[2].black
-            color_winrates.white += p[2].white
-            color_winrates.colorless += p[1].identityid == 1
-        color_playcounts.blue += p[2].blue
-        color_playcounts.red += p[2].red
-        color_playcounts.green += p[2].green
-        color_playcounts.black += p[2].black
-        color_playcounts.white += p[2].white
-        color_playcounts.colorless += p[1].identityid == 1
-        performance_count += 1
-
-    if color_playcounts.blue > 0:
-        color_winrates.blue /= color_playcounts.blue
-    if color_playcounts.red > 0:
-        color_winrates.red /= color_playcounts.red
-    if color_playcounts.green > 0:
-        color_winrates.green /= color_playcounts.green
-    if color_playcounts.black > 0:
-        color_winrates.black /= color_playcounts.black
-    if color_playcounts.white > 0:
-        color_winrates.white /= color_playcounts.white
-    if color_playcounts.colorless > 0:
-        color_winrates.colorless /= color_playcounts.colorless
-    
     return jsonify({"matchesplayed": matches_played,
-                    "averagematchsize": performance_count/matches_played,
+                    "averagematchsize": performance_count/matches_played if matches_played > 0 else 0,
                     "averagematchtime": matchtime,
-                    "colorplaycount": {"b": color_playcounts.black, "u": color_playcounts.blue,"r": color_playcounts.red,"g": color_playcounts.green,"w": color_playcounts.white,"c": color_playcounts.colorless},
-                    "colorwinrates": {"b": color_winrates.black, "u": color_winrates.blue,"r": color_winrates.red,"g": color_winrates.green,"w": color_winrates.white,"c": color_winrates.colorless}})
+                    "colorplaycount": color_playcounts,
+                    "colorwinrates": color_winrates(color_playcounts, color_wins)})
 
 @app.route('/stats/watchlist', methods=['GET'])
 @token_required
 @limiter.limit('')
 def get_watchlist_stats(current_user):
-        performances = db.session.query(Performance, Deck, Decklist, Card).filter(Deck.id==Performance.deckid).filter(Decklist.deckid==Deck.id).filter(Card.id==Decklist.cardid).all()
-        performances = list(filter(lambda x: x[3].watchlist==1, performances))
-        watchlist = Card.query.filter_by(watchlist=1).all()
-        res = []
-        for wcard in watchlist:
-            playcount = len(list(filter(lambda x: x[3].id==wcard.id, performances)))
-            wincount = len(list(filter(lambda x: x[3].id==wcard.id and x[0].placement=="1", performances)))
-            averageplacement = 0
-            for p in list(filter(lambda x: x[3].id==wcard.id, performances)):
-                if p[0].placement:
-                    averageplacement += p[0].placement
-            if playcount > 0:
-                averageplacement /= playcount
-            res.append({"id": wcard.id, "name": wcard.name, "playcount":playcount, "wincount": wincount, "average": averageplacement})
+    try:
+        since = parse_date_arg(request.args, 'since')
+        until = parse_date_arg(request.args, 'until')
+    except ValueError:
+        return jsonify({'message' : 'Invalid date provided!'}), 400
 
-        return jsonify({"data": res})
+    # plays, wins and placements are grouped per card in one query, unplayed watchlist cards come back as zeros
+    watchlist = Card.query.filter_by(watchlist=1).with_entities(Card.id)
+    totals = card_performance_totals(Decklist.cardid.in_(watchlist), since=since, until=until).subquery()
+    rows = db.session.query(Card.id, Card.name, totals.c.plays, totals.c.wins, totals.c.placementtotal)\
+        .outerjoin(totals, totals.c.cardid==Card.id)\
+        .filter(Card.watchlist==1).all()
+
+    res = []
+    for id, name, playcount, wincount, placementtotal in rows:
+        playcount = as_int(playcount)
+        averageplacement = as_int(placementtotal)/playcount if playcount > 0 else 0
+        res.append({"id": id, "name": name, "playcount": playcount, "wincount": as_int(wincount), "average": averageplacement})
+
+    return jsonify({"data": res})
+
+CUSTOM_CARDS_CUTOFF = datetime.datetime(2025, 4, 22)
 
 @app.route('/stats/cards', methods=['GET'])
 @token_required
 @limiter.limit('')
 def get_card_stats(current_user):
-    cards = {}
-    printings = Printing.query.all()
-    cardprints = {}
-    for p in printings:
-        if p.cardid not in cardprints:
-            cardprints[p.cardid] = p.artcrop
-    performances = db.session.query(Performance, Deck, Decklist, Card).filter(Deck.id==Performance.deckid).filter(Decklist.deckid==Deck.id).filter(Card.id==Decklist.cardid).all()
-    for p in performances:
-        if p.Card.id in cards:
-            cards[p.Card.id]["count"] = cards[p.Card.id]["count"] + 1
-            if p.Performance.placement:
-                cards[p.Card.id]["placementtotal"] += p.Performance.placement
-            if p.Performance.placement == 1:
-                cards[p.Card.id]["wins"] = cards[p.Card.id]["wins"] + 1
-        else:
-            cards[p.Card.id] = {}
-            cards[p.Card.id]["card"] = p.Card
-            cards[p.Card.id]["count"] = 1
-            cards[p.Card.id]["placementtotal"] = 0
-            if p.Card.id in cardprints:
-                cards[p.Card.id]["artcrop"] = cardprints[p.Card.id]
-            if p.Performance.placement:
-                cards[p.Card.id]["placementtotal"] += p.Performance.placement
-            if p.Performance.placement == 1:
-                cards[p.Card.id]["wins"] = 1
-            else:
-                cards[p.Card.id]["wins"] = 0
-    return jsonify({"cards": list(cards.items())})
+    return card_stats_response(None)
 
+# kept for the site's custom card page, same as /stats/cards?before=2025-04-22
 @app.route('/stats/cards/custom', methods=['GET'])
 @token_required
 @limiter.limit('')
 def get_card_stats_custom(current_user):
-    cards = {}
-    printings = Printing.query.all()
-    cardprints = {}
-    for p in printings:
-        if p.cardid not in cardprints:
-            cardprints[p.cardid] = p.artcrop
-    performances = db.session.query(Performance, Match, Deck, Decklist, Card).filter(Deck.id==Performance.deckid).filter(Decklist.deckid==Deck.id).filter(Card.id==Decklist.cardid).filter(Match.id==Performance.matchid).filter(Match.start<datetime.datetime(2025, 4, 22)).all()
-    for p in performances:
-        if p.Card.id in cards:
-            cards[p.Card.id]["count"] = cards[p.Card.id]["count"] + 1
-            if p.Performance.placement:
-                cards[p.Card.id]["placementtotal"] += p.Performance.placement
-            if p.Performance.placement == 1:
-                cards[p.Card.id]["wins"] = cards[p.Card.id]["wins"] + 1
-        else:
-            cards[p.Card.id] = {}
-            cards[p.Card.id]["card"] = p.Card
-            cards[p.Card.id]["count"] = 1
-            cards[p.Card.id]["placementtotal"] = 0
-            if p.Card.id in cardprints:
-                cards[p.Card.id]["artcrop"] = cardprints[p.Card.id]
-            if p.Performance.placement:
-                cards[p.Card.id]["placementtotal"] += p.Performance.placement
-            if p.Performance.placement == 1:
-                cards[p.Card.id]["wins"] = 1
-            else:
-                cards[p.Card.id]["wins"] = 0
-    return jsonify({"cards": list(cards.items())})
+    return card_stats_response(CUSTOM_CARDS_CUTOFF)
+
+def card_stats_response(defaultbefore):
+    try:
+        since = parse_date_arg(request.args, 'since')
+        before = parse_date_arg(request.args, 'before') or defaultbefore
+    except ValueError:
+        return jsonify({'message' : 'Invalid date provided!'}), 400
+
+    return jsonify({"cards": card_stats(since=since, before=before)})
 
 @app.route('/stats/users', methods=['GET'])
 @token_required
@@ -271,18 +139,63 @@ def get_allusers_stats(current_user):
     return jsonify({"usersStats": list(usersstats.items())})
 
 
+STATS_DUMP_TABLES = (('users', User), ('performances', Performance), ('matches', Match), ('decks', Deck), ('cards', Card), ('printings', Printing))
+# the catalog has no changelog, deltas resend it whole when its version differs from the client's catalog=<n>
+STATS_CATALOG_MODELS = (Card, Printing)
+
 @app.route('/stats/users/<id>', methods=['GET'])
 @token_required
 @limiter.limit('')
 def get_users_stats(current_user, id):
     #For right now we are just dumping all this to calc on the client end probably will change in the future
-    users = db.session.query(User).all()
-    performances = db.session.query(Performance).all()
-    matches = Match.query.all()
-    decks = Deck.query.filter_by(userid=id).all()
-
-    #probably can move this to a general fetch for pages to use in the future
-    printings = Printing.query.all()
-    cards = Card.query.filter_by().all()
-
-    return jsonify({"users": users, "performances": performances, "matches": matches, "decks": decks, "cards": cards, "printings": printings})
\ No newline at end of file
+    # since=<cursor> only sends rows changed after that cursor, stream=ndjson sends the dump in chunks
+    since = request.args.get('since', type=int)
+    cursor = current_cursor()
+    if since is not None and (since > cursor or since < (oldest_cursor() or 1) - 1):
+        since = None # unknown or pruned cursor, client has to take a full dump
+    catalog = sum(v[0] for v in table_versions('card', 'printing'))
+    fullcatalog = since is None or request.args.get('catalog', type=int) != catalog
+
+    def table_query(model):
+        q = model.query
+        if model is Deck:
+            q = q.filter_by(userid=id)
+        return q
+
+    def table_rows(key, model):
+        # full dumps walk the table in chunks, deltas load the changed ids in chunks
+        if since is None or (model in STATS_CATALOG_MODELS and fullcatalog):
+            yield from table_query(model).yield_per(1000)
+            return
+        if model in STATS_CATALOG_MODELS:
+            return
+        changed, _ = changed_since(model, since, cursor)
+        for i in range(0, len(changed), 1000):
+            yield from table_query(model).filter(model.id.in_(changed[i:i + 1000])).all()
+
+    def deleted_rows():
+        if since is None:
+            return {}
+        return {key: changed_since(model, since, cursor)[1] for key, model in STATS_DUMP_TABLES if model not in STATS_CATALOG_MODELS}
+
+    if request.args.get('stream') == 'ndjson':
+        def generate():
+            for key, model in STATS_DUMP_TABLES:
+                chunk = []
+                for row in table_rows(key, model):
+                    chunk.append(row)
+                    if len(chunk) >= 1000:
+                        yield app.json.dumps({"table": key, "rows": chunk}) + "\n"
+                        chunk = []
+                if chunk:
+                    yield app.json.dumps({"table": key, "rows": chunk}) + "\n"
+            yield app.json.dumps({"deleted": deleted_rows(), "cursor": cursor, "full": since is None, "catalog": catalog, "fullcatalog": fullcatalog}) + "\n"
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    res = {key: list(table_rows(key, model)) for key, model in STATS_DUMP_TABLES}
+    res["deleted"] = deleted_rows()
+    res["cursor"] = cursor
+    res["full"] = since is None
+    res["catalog"] = catalog
+    res["fullcatalog"] = fullcatalog
+    return jsonify(res)
@@ -2,11 +2,13 @@ from flask import request, jsonify
 from sqlalchemy.orm import aliased
 from helpers import scryfall_color_converter
 from models import Theme
+from caching import conditional
 from main import app, limiter, token_required, db
 
 @app.route('/themes', methods=['GET'])
 @token_required
 @limiter.limit('')
+@conditional('theme', public=False)
 def get_themes(current_user):
     themes = Theme.query.all()
     if not themes:
@@ -2,7 +2,7 @@ from flask import request, jsonify
 from werkzeug.security import generate_password_hash
 import uuid
 from models import User
-from main import app, limiter, token_required, db
+from main import app, limiter, token_required, db, forget_user
 
 @app.route('/user', methods=['POST'])
 @token_required
@@ -45,6 +45,7 @@ def update_user(current_user, username):
     #Handle changes here
 
     db.session.commit()
+    forget_user(user.id)
 
     return jsonify({'message' : 'Updated user'})
 
@@ -78,5 +79,6 @@ def update_user_pass(current_user, username):
     user.hash = hashed_password
     
     db.session.commit()
+    forget_user(user.id)
 
     return jsonify({'message' : 'Updated user'})
\ No newline at end of file
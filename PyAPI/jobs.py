@@ -0,0 +1,91 @@
+import datetime
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Job
+
+JOB_HANDLERS = {}
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='job')
+# a queued or running job whose row has not been touched for this long is taken to be abandoned by a dead process,
+# handlers checkpoint well inside it
+JOB_LEASE = datetime.timedelta(minutes=15)
+
+def job_handler(kind):
+    def register(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return register
+
+class JobContext:
+    # handed to job handlers, checkpoint() commits the handler's work together with its resume point
+    def __init__(self, job):
+        self.job = job
+        self.params = json.loads(job.params) if job.params else {}
+
+    @property
+    def checkpoint_data(self):
+        return json.loads(self.job.checkpoint) if self.job.checkpoint else {}
+
+    def set_total(self, total):
+        self.job.total = total
+        self.job.updated = datetime.datetime.utcnow()
+        db.session.commit()
+
+    def checkpoint(self, data, progress, commit=True):
+        # commit=False leaves it to the handler's own commit, for work that must never be redone once it is in
+        self.job.checkpoint = json.dumps(data)
+        self.job.progress = progress
+        self.job.updated = datetime.datetime.utcnow()
+        if commit:
+            db.session.commit()
+
+def submit_job(app, kind, params, userid=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError('Unknown job kind ' + kind)
+    now = datetime.datetime.utcnow()
+    job = Job(kind=kind, status='queued', params=json.dumps(params), progress=0, userid=userid, created=now, updated=now)
+    db.session.add(job)
+    db.session.commit()
+    executor.submit(run_job, app, job.id)
+    return job
+
+def stale_jobs(lease=JOB_LEASE):
+    cutoff = datetime.datetime.utcnow() - lease
+    return Job.query.filter(Job.status.in_(('queued', 'running'))).filter(Job.updated < cutoff).order_by(Job.id).all()
+
+def resume_job(app, job):
+    # failed or interrupted jobs keep their checkpoint so the handler picks up where it stopped. the requeue only
+    # applies if the row is unchanged since it was read, a job another worker has touched in between is left alone
+    requeued = Job.query.filter(Job.id == job.id, Job.status == job.status, Job.updated == job.updated)\
+        .update({Job.status: 'queued', Job.error: None, Job.updated: datetime.datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if not requeued:
+        return None
+    executor.submit(run_job, app, job.id)
+    return job
+
+def run_job(app, jobid):
+    with app.app_context():
+        try:
+            # claiming is one conditional update so a job handed to two executors still only runs once
+            claimed = Job.query.filter(Job.id == jobid, Job.status == 'queued')\
+                .update({Job.status: 'running', Job.updated: datetime.datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                return
+            job = db.session.get(Job, jobid)
+            try:
+                result = JOB_HANDLERS[job.kind](JobContext(job))
+            except Exception as e:
+                traceback.print_exc()
+                db.session.rollback()
+                job = db.session.get(Job, jobid)
+                job.status = 'failed'
+                job.error = str(e)[:2000]
+            else:
+                job.status = 'done'
+                job.result = json.dumps(result)
+            job.updated = datetime.datetime.utcnow()
+            db.session.commit()
+        finally:
+            db.session.remove()
@@ -0,0 +1,106 @@
+import hashlib
+from caching import LRUCache
+from changes import table_version, record_changes
+from models import db, Card, Deck, Decklist, Coloridentity
+
+YORION = 'e15504a7-2b67-4185-b916-172145f10b19' #yorion oracleid
+
+# results keyed by a hash of the decklist contents and the banlist version, so identical lists share a result
+legality_cache = LRUCache('legality', maxsize=4096)
+
+def banlist_version():
+    # banned flags live on the card table, any committed card change moves this on
+    return table_version('card')[0]
+
+def legality_key(hascommander, hasyorion, rows, version):
+    content = repr((hascommander, hasyorion, sorted((r[0] or 0, bool(r[1]), bool(r[2]), r[3] or '') for r in rows)))
+    return (hashlib.sha1(content.encode()).hexdigest(), version)
+
+def evaluate_legality(commander, companion, rows, version=None):
+    # rows are (count, issideboard, banned, name) for each decklist entry, batch callers read the banlist version once
+    key = legality_key(bool(commander), companion == YORION, rows, banlist_version() if version is None else version)
+    result = legality_cache.get(key)
+    if result is not None:
+        return result
+
+    legal = True
+    messages = []
+    if not commander:
+        legal = False
+        messages.append('Missing commander')
+
+    count = 0
+    sideboard_count = 0
+    for cardcount, issideboard, banned, name in rows:
+        if issideboard:
+            sideboard_count += cardcount
+        else:
+            count += cardcount
+        if banned:
+            legal = False
+            messages.append('Contains banned card '+str(name))
+    if companion == YORION:
+        if count != 80:
+            legal = False
+            messages.append('Invalid amount of cards. Expected 80, found '+str(count))
+    else:
+        if count != 60:
+            legal = False
+            messages.append('Invalid amount of cards. Expected 60, found '+str(count))
+    if sideboard_count and sideboard_count > 7:
+            legal = False
+            messages.append('Invalid amount of sideboard cards. Expected <= 7, found '+str(sideboard_count))
+
+    result = {"legal": legal, "messages": messages}
+    legality_cache.set(key, result)
+    return result
+
+def legality_rows_query():
+    # only the columns legality needs, cards without a known identity never counted
+    return db.session.query(Decklist.deckid, Decklist.count, Decklist.issideboard, Card.banned, Card.name).select_from(Decklist)\
+        .join(Card, Card.id==Decklist.cardid)\
+        .join(Coloridentity, Coloridentity.id==Card.identityid)
+
+def deck_legality(deck, version=None):
+    rows = [r[1:] for r in legality_rows_query().filter(Decklist.deckid == deck.id).all()]
+    return evaluate_legality(deck.commander, deck.companion, rows, version)
+
+def decks_legality(decks):
+    # batch validation, one query for every deck's rows
+    decks = list(decks)
+    rows = {d.id: [] for d in decks}
+    if rows:
+        for r in legality_rows_query().filter(Decklist.deckid.in_(list(rows))).all():
+            rows[r[0]].append(r[1:])
+    version = banlist_version()
+    return {d.id: evaluate_legality(d.commander, d.companion, rows[d.id], version) for d in decks}
+
+def affected_decks(cardids):
+    # reverse lookup from cards to the decks that list them
+    return db.session.query(Decklist.deckid).filter(Decklist.cardid.in_(list(cardids))).distinct()
+
+def recompute_legality(deckids):
+    # stores fresh islegal values for the given decks, returns the ids that became legal and illegal.
+    # the deck version moves in the same statement so the deck page and tts caches in every process let go of the old value
+    decks = db.session.query(Deck.id, Deck.commander, Deck.companion, Deck.islegal).filter(Deck.id.in_(list(deckids))).all()
+    results = decks_legality(decks)
+    nowlegal = [d.id for d in decks if results[d.id]['legal'] and d.islegal is not True]
+    nowillegal = [d.id for d in decks if not results[d.id]['legal'] and d.islegal is not False]
+    for ids, value in ((nowlegal, True), (nowillegal, False)):
+        if ids:
+            Deck.query.filter(Deck.id.in_(ids)).update({Deck.islegal: value, Deck.version: Deck.version + 1}, synchronize_session=False)
+            record_changes(Deck, ids)
+    return nowlegal, nowillegal
+
+def propagate_banlist(cardids, after=None, batch_size=500):
+    # walks the decks containing any of the cards in id order, yielding (last deck id, checked, now legal, now illegal)
+    # per batch, callers commit between batches
+    q = affected_decks(cardids).order_by(Decklist.deckid)
+    while True:
+        bq = q if after is None else q.filter(Decklist.deckid > after)
+        deckids = [r[0] for r in bq.limit(batch_size).all()]
+        if not deckids:
+            return
+        nowlegal, nowillegal = recompute_legality(deckids)
+        after = deckids[-1]
+        yield after, len(deckids), nowlegal, nowillegal
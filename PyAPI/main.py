@@ -4,9 +4,13 @@ from flask_limiter.util import get_remote_address
 from flask_cors import CORS
 from pathlib import Path
 import jwt
+import os
+import time
 import configparser
 from functools import wraps
 from models import *
+from caching import LRUCache
+from metrics import init_metrics
 
 app = Flask(__name__)
 
@@ -19,13 +23,28 @@ limiter = Limiter(
 
 CORS(app)
 config = configparser.ConfigParser()
-config.read(Path(__file__).with_name('config.ini'))
+# BBSITEAPI_CONFIG points at another config file, the benchmarks use it to run against their own database
+config.read(os.environ.get('BBSITEAPI_CONFIG', Path(__file__).with_name('config.ini')))
 
 app.config['SECRET_KEY'] = config['SECURITY']['SECRET_KEY']
 app.config['SQLALCHEMY_DATABASE_URI'] = config['DATABASE']['CONNECTION']
 app.config['API_VERSION'] = config['API']['VERSION']
+app.config['SCRYFALL_URL'] = config.get('SCRYFALL', 'URL', fallback='https://api.scryfall.com')
+app.config['SCRYFALL_RATE'] = config.getfloat('SCRYFALL', 'RATE', fallback=10)
+app.config['METRICS_HEADERS'] = config.getboolean('METRICS', 'HEADERS', fallback=False)
 
 db.init_app(app)
+init_metrics(app)
+
+# decoded tokens -> detached user snapshots, so authenticating doesnt cost a query on every call
+auth_cache = LRUCache('auth', maxsize=2048, ttl=60)
+
+def user_snapshot(user):
+    return User(id=user.id, publicid=user.publicid, username=user.username, admin=user.admin)
+
+def forget_user(uid):
+    # call after changing a user so their next request reloads them
+    auth_cache.drop_where(lambda u: u.id == uid)
 
 def token_required(f):
     @wraps(f)
@@ -36,6 +55,11 @@ def token_required(f):
 
         if not token:
             return jsonify({'message' : 'Token is missing!'}), 401
+
+        current_user = auth_cache.get(token)
+        if current_user is not None:
+            return f(current_user, *args, **kwargs)
+
         try: 
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
             if "version" in data:
@@ -48,6 +72,15 @@ def token_required(f):
         except:
             return jsonify({'message' : 'Token is invalid!'}), 401
 
+        if current_user:
+            current_user = user_snapshot(current_user)
+            # never keep a token around past its own expiry
+            ttl = auth_cache.ttl
+            if 'exp' in data:
+                ttl = min(ttl, data['exp'] - time.time())
+            if ttl > 0:
+                auth_cache.set(token, current_user, ttl=ttl)
+
         return f(current_user, *args, **kwargs)
 
     return decorated
@@ -62,6 +95,10 @@ from endpoints.color_endpoints import *
 from endpoints.card_endpoints import *
 from endpoints.stats_endpoints import *
 from endpoints.theme_endpoints import *
+from endpoints.job_endpoints import *
+from endpoints.cache_endpoints import *
+from endpoints.metrics_endpoints import *
+import commands
 
 if __name__ == "__main__":
     app.run(debug=True)
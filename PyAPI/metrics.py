@@ -0,0 +1,146 @@
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+from caching import CACHES
+import scryfall
+
+# prometheus style counters and histograms kept in process, /metrics renders them in the text format
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BACKGROUND = 'background' # queries run by jobs and cli commands outside of any request
+
+_lock = threading.Lock()
+counters = {} # (name, labels) -> value
+histograms = {} # (name, labels) -> [bucket counts..., sum, count]
+
+HELP = {
+    'bbsiteapi_requests_total': ('counter', 'Requests served'),
+    'bbsiteapi_request_duration_seconds': ('histogram', 'Request latency'),
+    'bbsiteapi_request_queries': ('histogram', 'SQL statements per request'),
+    'bbsiteapi_db_queries_total': ('counter', 'SQL statements executed'),
+    'bbsiteapi_db_query_seconds_total': ('counter', 'Time spent executing SQL'),
+    'bbsiteapi_orm_rows_loaded_total': ('counter', 'ORM objects loaded from query results'),
+    'bbsiteapi_scryfall_requests_total': ('counter', 'HTTP requests made to scryfall'),
+    'bbsiteapi_cache_hits_total': ('counter', 'In process cache hits'),
+    'bbsiteapi_cache_misses_total': ('counter', 'In process cache misses'),
+    'bbsiteapi_cache_entries': ('gauge', 'Entries held by each in process cache'),
+}
+
+def inc(name, labels, value=1):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        counters[key] = counters.get(key, 0) + value
+
+def observe(name, labels, value, buckets):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        h = histograms.get(key)
+        if h is None:
+            h = histograms[key] = [0] * (len(buckets) + 2)
+        for i, b in enumerate(buckets):
+            if value <= b:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+def current_stats():
+    # per request totals live on g, anything outside a request is only counted globally
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+def endpoint_label():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return BACKGROUND
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['querytime'] += elapsed
+    else:
+        inc('bbsiteapi_db_queries_total', {'endpoint': endpoint_label()})
+        inc('bbsiteapi_db_query_seconds_total', {'endpoint': endpoint_label()}, elapsed)
+
+@event.listens_for(Mapper, 'load')
+def count_loaded_row(target, context):
+    stats = current_stats()
+    if stats is not None:
+        stats['rows'] += 1
+    else:
+        inc('bbsiteapi_orm_rows_loaded_total', {'endpoint': endpoint_label()})
+
+def start_request():
+    g.sql_stats = {'queries': 0, 'querytime': 0.0, 'rows': 0, 'started': time.perf_counter()}
+
+def finish_request(response, headers=False):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats['started']
+    endpoint = endpoint_label()
+    inc('bbsiteapi_requests_total', {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)})
+    observe('bbsiteapi_request_duration_seconds', {'endpoint': endpoint}, elapsed, LATENCY_BUCKETS)
+    observe('bbsiteapi_request_queries', {'endpoint': endpoint}, stats['queries'], QUERY_BUCKETS)
+    inc('bbsiteapi_db_queries_total', {'endpoint': endpoint}, stats['queries'])
+    inc('bbsiteapi_db_query_seconds_total', {'endpoint': endpoint}, stats['querytime'])
+    inc('bbsiteapi_orm_rows_loaded_total', {'endpoint': endpoint}, stats['rows'])
+    if headers:
+        response.headers['X-Query-Count'] = str(stats['queries'])
+        response.headers['Server-Timing'] = 'db;desc="%d queries";dur=%.1f, total;dur=%.1f' % (stats['queries'], stats['querytime'] * 1000, elapsed * 1000)
+    return response
+
+def init_metrics(app):
+    @app.after_request
+    def record_request(response):
+        return finish_request(response, headers=app.config.get('METRICS_HEADERS', False))
+
+    app.before_request(start_request)
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+def render():
+    # text exposition format 0.0.4
+    samples = {}
+    with _lock:
+        for (name, labels), value in sorted(counters.items()):
+            samples.setdefault(name, []).append(name + format_labels(labels) + ' ' + repr(value))
+        for (name, labels), h in sorted(histograms.items()):
+            buckets = LATENCY_BUCKETS if name == 'bbsiteapi_request_duration_seconds' else QUERY_BUCKETS
+            lines = samples.setdefault(name, [])
+            for b, count in zip(buckets, h):
+                lines.append(name + '_bucket' + format_labels(labels, [('le', repr(b))]) + ' ' + str(count))
+            lines.append(name + '_bucket' + format_labels(labels, [('le', '+Inf')]) + ' ' + str(h[-1]))
+            lines.append(name + '_sum' + format_labels(labels) + ' ' + repr(h[-2]))
+            lines.append(name + '_count' + format_labels(labels) + ' ' + str(h[-1]))
+
+    client = scryfall._client
+    samples['bbsiteapi_scryfall_requests_total'] = ['bbsiteapi_scryfall_requests_total ' + str(client.calls if client else 0)]
+    for cachename, cache in sorted(CACHES.items()):
+        stats = cache.stats()
+        labels = [('cache', cachename)]
+        samples.setdefault('bbsiteapi_cache_hits_total', []).append('bbsiteapi_cache_hits_total' + format_labels(labels) + ' ' + str(stats['hits']))
+        samples.setdefault('bbsiteapi_cache_misses_total', []).append('bbsiteapi_cache_misses_total' + format_labels(labels) + ' ' + str(stats['misses']))
+        samples.setdefault('bbsiteapi_cache_entries', []).append('bbsiteapi_cache_entries' + format_labels(labels) + ' ' + str(stats['size']))
+
+    out = []
+    for name in sorted(samples):
+        kind, help = HELP[name]
+        out.append('# HELP %s %s' % (name, help))
+        out.append('# TYPE %s %s' % (name, kind))
+        out.extend(samples[name])
+    return '\n'.join(out) + '\n'
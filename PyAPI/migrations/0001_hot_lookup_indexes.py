@@ -0,0 +1,30 @@
+import sqlalchemy as sa
+from migrations import create_index
+
+INDEXES = [
+    ('ix_decklist_deckid', 'decklist', ['deckid'], False),
+    ('ix_decklist_cardid', 'decklist', ['cardid'], False),
+    ('ix_performance_matchid', 'performance', ['matchid'], False),
+    ('ix_performance_userid', 'performance', ['userid'], False),
+    ('ix_performance_deckid', 'performance', ['deckid'], False),
+    ('ix_card_name', 'card', ['name'], False),
+    ('ix_card_banned', 'card', ['banned'], False),
+    ('ix_card_watchlist', 'card', ['watchlist'], False),
+    ('ix_card_custom', 'card', ['custom'], False),
+    ('ix_printing_cardid', 'printing', ['cardid'], False),
+    ('uq_cardtoken_cardid_tokenid', 'cardtoken', ['cardid', 'tokenid'], True),
+    ('ix_printfavorite_userid_cardid', 'printfavorite', ['userid', 'cardid'], False),
+    ('ix_match_eventid', 'match', ['eventid'], False),
+    ('ix_deck_userid', 'deck', ['userid'], False),
+    ('ix_changelog_tablename_id', 'changelog', ['tablename', 'id'], False),
+]
+
+def upgrade(conn):
+    tables = set(sa.inspect(conn).get_table_names())
+    # older token refreshes could store the same card/token pair more than once, keep the first before going unique
+    # (the derived table is there because mysql wont delete from a table it is selecting from)
+    if 'cardtoken' in tables:
+        conn.execute(sa.text('DELETE FROM cardtoken WHERE id NOT IN (SELECT keep FROM (SELECT MIN(id) AS keep FROM cardtoken GROUP BY cardid, tokenid) AS firsts)'))
+    for name, tablename, columns, unique in INDEXES:
+        if tablename in tables:
+            create_index(conn, name, tablename, columns, unique)
@@ -0,0 +1,10 @@
+from changes import install_version_triggers
+from models import Tableversion
+
+# the tables behind etags and in process caches get version counters kept by triggers, on mysql creating them needs
+# the TRIGGER privilege (and SUPER or log_bin_trust_function_creators when binary logging is on)
+TABLES = ('card', 'printing', 'cardtoken', 'coloridentity', 'event', 'theme')
+
+def upgrade(conn):
+    Tableversion.__table__.create(conn, checkfirst=True)
+    install_version_triggers(conn, TABLES)
@@ -0,0 +1,12 @@
+import datetime
+import sqlalchemy as sa
+from models import Tableversion
+
+def upgrade(conn):
+    # cards and printings are no longer logged row by row, drop what bulk imports left behind
+    if 'changelog' in set(sa.inspect(conn).get_table_names()):
+        conn.execute(sa.text("DELETE FROM changelog WHERE tablename IN ('card', 'printing')"))
+    # writers lock this row while they add their entries so changelog ids follow commit order
+    table = Tableversion.__table__
+    if conn.execute(sa.select(table.c.tablename).where(table.c.tablename == 'changelog')).first() is None:
+        conn.execute(table.insert().values(tablename='changelog', version=0, updated=datetime.datetime.utcnow().replace(microsecond=0)))
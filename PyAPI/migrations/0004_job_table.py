@@ -0,0 +1,5 @@
+from models import Job
+
+def upgrade(conn):
+    # background jobs, init-db databases already have it from create_all
+    Job.__table__.create(conn, checkfirst=True)
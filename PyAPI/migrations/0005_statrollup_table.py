@@ -0,0 +1,10 @@
+import sqlalchemy as sa
+from models import Statrollup
+from rollups import rebuild_rollups
+
+def upgrade(conn):
+    # per user stats rollups, filled from the performance history when the table is new
+    if 'statrollup' in set(sa.inspect(conn).get_table_names()):
+        return
+    Statrollup.__table__.create(conn)
+    rebuild_rollups()
@@ -0,0 +1,5 @@
+from models import Changelog
+
+def upgrade(conn):
+    # delta sync entries, existing clients start with a full dump since there is nothing to diff against yet
+    Changelog.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,7 @@
+import sqlalchemy as sa
+
+def upgrade(conn):
+    # the deck caches and the /decklist etag key on this counter, lastupdated only has whole seconds on mysql
+    columns = {c['name'] for c in sa.inspect(conn).get_columns('deck')}
+    if 'version' not in columns:
+        conn.execute(sa.text('ALTER TABLE deck ADD COLUMN version INTEGER NOT NULL DEFAULT 0'))
@@ -0,0 +1,44 @@
+import datetime
+import importlib
+import pkgutil
+import sqlalchemy as sa
+from models import db, Schemaversion
+
+# each migration is a module named NNNN_description.py with an upgrade(conn) function,
+# they run in number order and the applied ones are recorded in the schemaversion table
+
+def available_migrations():
+    migrations = []
+    for m in pkgutil.iter_modules(__path__):
+        number, _, description = m.name.partition('_')
+        if number.isdigit():
+            migrations.append((int(number), description.replace('_', ' '), m.name))
+    return sorted(migrations)
+
+def current_version():
+    Schemaversion.__table__.create(db.engine, checkfirst=True)
+    return db.session.query(sa.func.max(Schemaversion.version)).scalar() or 0
+
+def upgrade(target=None, log=print):
+    applied = []
+    version = current_version()
+    for number, description, name in available_migrations():
+        if number <= version or (target is not None and number > target):
+            continue
+        log(f'Applying {number:04d} {description}')
+        module = importlib.import_module(__name__ + '.' + name)
+        # every migration commits on its own so a failure leaves the earlier ones recorded
+        module.upgrade(db.session.connection())
+        db.session.add(Schemaversion(version=number, description=description, applied=datetime.datetime.utcnow()))
+        db.session.commit()
+        applied.append(number)
+    return applied
+
+def create_index(conn, name, tablename, columns, unique=False):
+    # skips indexes that already exist under the name or over the same columns (mysql adds one per foreign key)
+    existing = sa.inspect(conn).get_indexes(tablename)
+    if any(i['name'] == name or (list(i['column_names']) == list(columns) and (i['unique'] or not unique)) for i in existing):
+        return False
+    table = sa.Table(tablename, sa.MetaData(), autoload_with=conn)
+    sa.Index(name, *[table.c[c] for c in columns], unique=unique).create(conn)
+    return True
@@ -0,0 +1,47 @@
+import sqlalchemy as sa
+from models import db, Card, Cardtoken, Changelog, Deck, Decklist, Match, Performance, Printfavorite, Printing
+
+# the lookups behind the busy endpoints, each should be answered from an index rather than a table scan
+HOT_QUERIES = [
+    ('decklist by deck', 'decklist', sa.select(Decklist).where(Decklist.deckid == 1)),
+    ('decklist by card', 'decklist', sa.select(Decklist.deckid).where(Decklist.cardid.in_(['a', 'b'])).distinct()),
+    ('performances by match', 'performance', sa.select(Performance).where(Performance.matchid.in_([1, 2]))),
+    ('performances by user', 'performance', sa.select(Performance).where(Performance.userid == 1)),
+    ('performances by deck', 'performance', sa.select(Performance).where(Performance.deckid == 1)),
+    ('cards by name', 'card', sa.select(Card).where(Card.name.in_(['a', 'b']))),
+    ('banlist', 'card', sa.select(Card).where(Card.banned == True)),
+    ('watchlist', 'card', sa.select(Card).where(Card.watchlist == True)),
+    ('custom cards', 'card', sa.select(Card).where(Card.custom == True)),
+    ('printings by card', 'printing', sa.select(Printing).where(Printing.cardid.in_(['a', 'b']))),
+    ('tokens by card', 'cardtoken', sa.select(Cardtoken).where(Cardtoken.cardid.in_(['a', 'b']))),
+    ('print favorites', 'printfavorite', sa.select(Printfavorite).where(Printfavorite.userid == 1).where(Printfavorite.cardid == 'a')),
+    ('matches by event', 'match', sa.select(Match).where(Match.eventid == 1)),
+    ('decks by user', 'deck', sa.select(Deck).where(Deck.userid == 1)),
+    ('changes since cursor', 'changelog', sa.select(Changelog).where(Changelog.tablename == 'deck').where(Changelog.id > 1)),
+]
+
+def explain(statement):
+    dialect = db.engine.dialect.name
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if dialect == 'sqlite':
+        return [r[-1] for r in db.session.execute(sa.text('EXPLAIN QUERY PLAN ' + sql))]
+    if dialect == 'mysql':
+        return [dict(r._mapping) for r in db.session.execute(sa.text('EXPLAIN ' + sql))]
+    raise ValueError('EXPLAIN check not supported for ' + dialect)
+
+def uses_index(plan, tablename):
+    for step in plan:
+        if isinstance(step, dict):
+            if step.get('table') == tablename:
+                return step.get('key') is not None and step.get('type') != 'ALL'
+        elif step.startswith('SEARCH ' + tablename + ' '):
+            return 'INDEX' in step
+    return False
+
+def check_hot_queries():
+    # returns (name, ok, plan) for every hot query
+    results = []
+    for name, tablename, statement in HOT_QUERIES:
+        plan = explain(statement)
+        results.append((name, uses_index(plan, tablename), plan))
+    return results
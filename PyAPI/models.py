@@ -33,15 +33,15 @@ class Card(db.Model):
     transform: bool
 
     id = db.Column(db.String(46), primary_key=True)
-    name = db.Column(db.String(64))
+    name = db.Column(db.String(64), index=True)
     typeline = db.Column(db.String(128))
     oracletext = db.Column(db.String(2000))
     mv = db.Column(db.Integer)
     cost = db.Column(db.String(64))
     identityid = db.Column(db.Integer, db.ForeignKey('coloridentity.id'))
-    banned = db.Column(db.Boolean)
-    watchlist = db.Column(db.Boolean)
-    custom = db.Column(db.Boolean)
+    banned = db.Column(db.Boolean, index=True)
+    watchlist = db.Column(db.Boolean, index=True)
+    custom = db.Column(db.Boolean, index=True)
     transform = db.Column(db.Boolean)
 
 @dataclass
@@ -61,7 +61,7 @@ class Deck(db.Model):
     image: str
 
     id = db.Column(db.Integer, primary_key=True)
-    userid = db.Column(db.Integer, db.ForeignKey('user.id'))
+    userid = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     name = db.Column(db.String(64))
     lastused = db.Column(db.DateTime)
     commander = db.Column(db.String(36), db.ForeignKey('card.id'))
@@ -73,6 +73,8 @@ class Deck(db.Model):
     islegal = db.Column(db.Boolean)
     picpos = db.Column(db.String(24))
     image = db.Column(db.String(256))
+    # moves on every change to what the deck page, tts export or decklist show, the caches are keyed on it
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 @dataclass
 class Coloridentity(db.Model):
@@ -119,7 +121,7 @@ class Match(db.Model):
     power: int
 
     id = db.Column(db.Integer, primary_key=True)
-    eventid = db.Column(db.Integer, db.ForeignKey('event.id'))
+    eventid = db.Column(db.Integer, db.ForeignKey('event.id'), index=True)
     name = db.Column(db.String(64))
     start = db.Column(db.DateTime)
     end = db.Column(db.DateTime)
@@ -140,9 +142,9 @@ class Performance(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     username = ''
-    matchid = db.Column(db.Integer, db.ForeignKey('match.id'))
-    userid = db.Column(db.Integer, db.ForeignKey('user.id'))
-    deckid = db.Column(db.Integer, db.ForeignKey('deck.id'))
+    matchid = db.Column(db.Integer, db.ForeignKey('match.id'), index=True)
+    userid = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    deckid = db.Column(db.Integer, db.ForeignKey('deck.id'), index=True)
     order = db.Column(db.Integer)
     placement = db.Column(db.Integer)
     killedby = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -180,8 +182,8 @@ class Decklist(db.Model):
     issideboard: bool
 
     id = db.Column(db.Integer, primary_key=True)
-    deckid = db.Column(db.Integer, db.ForeignKey('deck.id'))
-    cardid = db.Column(db.String(36), db.ForeignKey('card.id'))
+    deckid = db.Column(db.Integer, db.ForeignKey('deck.id'), index=True)
+    cardid = db.Column(db.String(36), db.ForeignKey('card.id'), index=True)
     count = db.Column(db.Integer)
     iscommander = db.Column(db.Boolean)
     iscompanion = db.Column(db.Boolean)
@@ -196,7 +198,7 @@ class Printing(db.Model):
     releasedate: datetime
 
     id = db.Column(db.String(36), primary_key=True)
-    cardid = db.Column(db.String(46), db.ForeignKey('card.id'))
+    cardid = db.Column(db.String(46), db.ForeignKey('card.id'), index=True)
     cardimage = db.Column(db.String(256))
     artcrop = db.Column(db.String(256))
     releasedate = db.Column(db.DateTime)
@@ -210,6 +212,7 @@ class Cardtoken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     cardid = db.Column(db.String(46), db.ForeignKey('card.id'))
     tokenid = db.Column(db.String(46))
+    __table_args__ = (db.Index('uq_cardtoken_cardid_tokenid', 'cardid', 'tokenid', unique=True),)
 
 @dataclass
 class Printfavorite(db.Model):
@@ -221,4 +224,84 @@ class Printfavorite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     userid = db.Column(db.Integer, db.ForeignKey('user.id'))
     cardid = db.Column(db.String(46), db.ForeignKey('card.id'))
-    printingid = db.Column(db.String(48), db.ForeignKey('printing.id'))
\ No newline at end of file
+    printingid = db.Column(db.String(48), db.ForeignKey('printing.id'))
+    __table_args__ = (db.Index('ix_printfavorite_userid_cardid', 'userid', 'cardid'),)
+
+@dataclass
+class Job(db.Model):
+    id: int
+    kind: str
+    status: str
+    progress: int
+    total: int
+    result: str
+    error: str
+    userid: int
+    created: datetime
+    updated: datetime
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32))
+    status = db.Column(db.String(16))
+    params = db.Column(db.Text)
+    checkpoint = db.Column(db.Text)
+    progress = db.Column(db.Integer)
+    total = db.Column(db.Integer)
+    result = db.Column(db.Text)
+    error = db.Column(db.String(2000))
+    userid = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created = db.Column(db.DateTime)
+    updated = db.Column(db.DateTime)
+
+@dataclass
+class Statrollup(db.Model):
+    userid: int
+    themed: bool
+    color: str
+    plays: int
+    wins: int
+    placementtotal: int
+
+    id = db.Column(db.Integer, primary_key=True)
+    userid = db.Column(db.Integer, db.ForeignKey('user.id'))
+    themed = db.Column(db.Boolean)
+    color = db.Column(db.String(3))
+    plays = db.Column(db.Integer)
+    wins = db.Column(db.Integer)
+    placementtotal = db.Column(db.Integer)
+    __table_args__ = (db.UniqueConstraint('userid', 'themed', 'color'),)
+
+@dataclass
+class Changelog(db.Model):
+    id: int
+    tablename: str
+    rowid: str
+    deleted: bool
+    changed: datetime
+
+    id = db.Column(db.Integer, primary_key=True)
+    tablename = db.Column(db.String(32))
+    rowid = db.Column(db.String(48))
+    deleted = db.Column(db.Boolean)
+    changed = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_changelog_tablename_id', 'tablename', 'id'),)
+
+@dataclass
+class Schemaversion(db.Model):
+    version: int
+    description: str
+    applied: datetime
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(128))
+    applied = db.Column(db.DateTime)
+
+@dataclass
+class Tableversion(db.Model):
+    tablename: str
+    version: int
+    updated: datetime
+
+    tablename = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.DateTime)
@@ -0,0 +1,105 @@
+from sqlalchemy import func, case
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from colors import stat_colors
+from models import db, Statrollup, Performance, Match, Event, Deck
+
+# one row per (user, themed, color) where color 'all' holds the totals and 'c' is colorless decks
+ROLLUP_COLORS = ('all', 'b', 'u', 'r', 'g', 'w', 'c')
+ROLLUP_COUNTERS = ('plays', 'wins', 'placementtotal')
+
+def rollup_themed(themed):
+    # the non themed stats only count events explicitly marked themed=False, so null counts as themed
+    return themed is None or bool(themed)
+
+def rollup_colors(identityid):
+    colors = stat_colors(identityid)
+    return None if colors is None else ['all'] + colors
+
+def placement_value(placement):
+    # placements arrive straight from request json so they can still be strings here
+    if placement is None or placement == '':
+        return None
+    return int(placement)
+
+def performance_contribution(performance):
+    placement = placement_value(performance.placement)
+    if placement is None or not performance.deckid or not performance.matchid:
+        return None
+    row = db.session.query(Event.themed, Deck.identityid).select_from(Match)\
+        .join(Event, Event.id==Match.eventid)\
+        .join(Deck, Deck.id==performance.deckid)\
+        .filter(Match.id==performance.matchid).first()
+    if not row or rollup_colors(row[1]) is None:
+        return None
+    return (performance.userid, rollup_themed(row[0]), tuple(rollup_colors(row[1])), placement)
+
+def match_contributions(matchid):
+    # the contribution of every performance in a match from one query, for removing a whole match at once
+    rows = db.session.query(Performance.userid, Performance.placement, Event.themed, Deck.identityid).select_from(Performance)\
+        .join(Match, Match.id==Performance.matchid)\
+        .join(Event, Event.id==Match.eventid)\
+        .join(Deck, Deck.id==Performance.deckid)\
+        .filter(Performance.matchid==matchid).all()
+    contributions = []
+    for userid, placement, themed, identityid in rows:
+        placement = placement_value(placement)
+        if placement is not None and rollup_colors(identityid) is not None:
+            contributions.append((userid, rollup_themed(themed), tuple(rollup_colors(identityid)), placement))
+    return contributions
+
+def apply_contribution(contribution, sign):
+    # a single upsert adding to every color row, concurrent reports for the same user add up in the database
+    # instead of one read-modify-write overwriting the other or both inserting the same missing row
+    if contribution is None:
+        return
+    userid, themed, colors, placement = contribution
+    rows = [{'userid': userid, 'themed': themed, 'color': color, 'plays': sign, 'wins': sign * (placement == 1), 'placementtotal': sign * placement} for color in colors]
+    table = Statrollup.__table__
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in ROLLUP_COUNTERS})
+    else:
+        stmt = sqlite.insert(table).values(rows) if db.engine.dialect.name == 'sqlite' else postgresql.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=['userid', 'themed', 'color'], set_={c: table.c[c] + stmt.excluded[c] for c in ROLLUP_COUNTERS})
+    db.session.execute(stmt)
+
+def update_rollups(old, new):
+    # callers grab the contribution before and after their change, nothing happens if it didnt move
+    if old == new:
+        return
+    apply_contribution(old, -1)
+    apply_contribution(new, 1)
+
+def rebuild_rollups(userids=None):
+    q = Statrollup.query
+    if userids is not None:
+        q = q.filter(Statrollup.userid.in_(userids))
+    q.delete(synchronize_session=False)
+
+    totals = db.session.query(Performance.userid, Event.themed, Deck.identityid,
+                              func.count(Performance.id), func.sum(case((Performance.placement == 1, 1), else_=0)), func.sum(Performance.placement))\
+        .join(Match, Match.id==Performance.matchid)\
+        .join(Event, Event.id==Match.eventid)\
+        .join(Deck, Deck.id==Performance.deckid)\
+        .filter(Performance.placement != None)
+    if userids is not None:
+        totals = totals.filter(Performance.userid.in_(userids))
+    totals = totals.group_by(Performance.userid, Event.themed, Deck.identityid).all()
+
+    rows = {}
+    for userid, themed, identityid, plays, wins, placementtotal in totals:
+        for color in rollup_colors(identityid) or ():
+            key = (userid, rollup_themed(themed), color)
+            row = rows.setdefault(key, [0, 0, 0])
+            row[0] += plays
+            row[1] += wins
+            row[2] += placementtotal
+    db.session.add_all([Statrollup(userid=k[0], themed=k[1], color=k[2], plays=v[0], wins=v[1], placementtotal=v[2]) for k, v in rows.items()])
+    db.session.commit()
+    return len(rows)
+
+def users_for_decks(deckids):
+    return [r[0] for r in db.session.query(Performance.userid).filter(Performance.deckid.in_(deckids)).distinct().all()]
+
+def users_for_event(eventid):
+    return [r[0] for r in db.session.query(Performance.userid).join(Match, Match.id==Performance.matchid).filter(Match.eventid==eventid).distinct().all()]
@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+
+SCRYFALL_URL = 'https://api.scryfall.com'
+HEADERS = {
+    'User-Agent': 'RumbleMTG/1.0 (contact: antraiti@github)',
+    'Accept': 'application/json',
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class ScryfallError(Exception):
+    pass
+
+class TokenBucket:
+    # scryfall asks for no more than ~10 requests a second, every request takes a token first
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ScryfallClient:
+    def __init__(self, base_url=SCRYFALL_URL, rate=10, workers=4, retries=3, backoff=0.5, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.bucket = TokenBucket(rate)
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.calls = 0
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            # scryfall hands back absolute uris (all_parts, next_page), keep them on our host so stubs work
+            if path.startswith(SCRYFALL_URL):
+                return self.base_url + path[len(SCRYFALL_URL):]
+            return path
+        return self.base_url + path
+
+    def get(self, path):
+        # returns the decoded json, None for 404s (scryfall's empty search result), anything else that goes wrong
+        # comes out as ScryfallError once retries run out
+        url = self.url(path)
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            with self.bucket.lock:
+                self.calls += 1
+            try:
+                res = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise ScryfallError(f'{url}: {e}')
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            if res.status_code == 404:
+                return None
+            if res.status_code in RETRY_STATUSES:
+                if attempt == self.retries:
+                    raise ScryfallError(f'{url}: HTTP {res.status_code}')
+                retryafter = res.headers.get('Retry-After')
+                time.sleep(float(retryafter) if retryafter and retryafter.isdigit() else self.backoff * 2 ** attempt)
+                continue
+            if res.status_code >= 400:
+                raise ScryfallError(f'{url}: HTTP {res.status_code}')
+            try:
+                return res.json()
+            except ValueError as e:
+                raise ScryfallError(f'{url}: bad json ({e})')
+
+    def get_many(self, paths):
+        # results come back in the same order as paths, concurrency is still bounded by the token bucket
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self.get, paths))
+
+    def search_all(self, path):
+        res = self.get(path)
+        data = []
+        while res:
+            data += res.get('data', [])
+            res = self.get(res['next_page']) if res.get('has_more') else None
+        return data
+
+    def oracle_search_path(self, oracleid, prints=False):
+        return '/cards/search?q=' + quote('oracleid=' + oracleid) + ('&unique=prints' if prints else '')
+
+    def cards_by_oracle(self, oracleids):
+        return self.get_many([self.oracle_search_path(o) for o in oracleids])
+
+    def prints_by_oracle(self, oracleids):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(lambda o: self.search_all(self.oracle_search_path(o, prints=True)), oracleids))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client(app):
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ScryfallClient(base_url=app.config.get('SCRYFALL_URL', SCRYFALL_URL), rate=app.config.get('SCRYFALL_RATE', 10))
+        return _client
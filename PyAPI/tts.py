@@ -0,0 +1,76 @@
+from sqlalchemy import or_
+from caching import LRUCache
+from changes import table_versions
+from models import db, Card, Cardtoken, Deck, Decklist, Printfavorite, Printing
+
+# finished exports as json text, tts clients refetch the same decks all match night
+tts_cache = LRUCache('tts', maxsize=256, ttl=3600)
+
+def tts_cache_key(deck):
+    # edits to the deck row or its list and favorite changes all bump the deck version, the table versions only cover
+    # the catalog the art comes from
+    return (deck.id, deck.version) + tuple(v[0] for v in table_versions('card', 'printing', 'cardtoken'))
+
+def favorite_decks(userid, cardid):
+    # decks of a user whose export can show this card, listed directly, as the back of a listed card or as a token
+    listed = [cardid, cardid[:-len('/back')]] if cardid.endswith('/back') else [cardid]
+    makers = db.session.query(Cardtoken.cardid).filter(Cardtoken.tokenid == cardid)
+    return [r[0] for r in db.session.query(Decklist.deckid).join(Deck, Deck.id==Decklist.deckid)\
+            .filter(Deck.userid == userid).filter(or_(Decklist.cardid.in_(listed), Decklist.cardid.in_(makers))).distinct().all()]
+
+def build_tts_export(deck):
+    cardlist = [tuple(row) for row in db.session.query(Decklist, Card).select_from(Decklist)\
+                .join(Card, Decklist.cardid==Card.id, isouter=True)\
+                .filter(Decklist.deckid == deck.id).all()]
+
+    cardbacks = db.session.query(Card).filter(Card.id.in_((map(lambda x: (x[0].cardid+"/back"), cardlist)))).all()
+
+    tokens = db.session.query(Cardtoken).filter(Cardtoken.cardid.in_(map(lambda x: str(x[0].cardid),cardlist))).all()
+
+    cardMap = list(map(lambda x: str(x[0].cardid),cardlist))
+    backMap = list(map(lambda x: x.id, cardbacks))
+    tokenMap = list(set(map(lambda x: x.tokenid, tokens)))
+    combMap = cardMap + backMap + tokenMap
+    printings = db.session.query(Printing).filter(Printing.cardid.in_(combMap)).all()
+    printFavorites = db.session.query(Printfavorite).filter(Printfavorite.userid == deck.userid).filter(Printfavorite.cardid.in_(combMap)).all()
+
+    # index once instead of scanning the printing lists for every card
+    printsById = {p.id: p for p in printings}
+    firstPrints = {}
+    for p in printings:
+        firstPrints.setdefault(p.cardid, p)
+    favorites = {}
+    for f in printFavorites:
+        favorites.setdefault(f.cardid, f.printingid)
+
+    def pick_printing(cardid):
+        # a favorite wins even if its printing is missing, same as before
+        if cardid in favorites:
+            return printsById.get(favorites[cardid])
+        return firstPrints.get(cardid)
+
+    formattedCardlist = []
+    for c in cardlist:
+        printing = pick_printing(c[1].id)
+        backPrinting = pick_printing(c[1].id + "/back")
+        formattedCardlist.append({
+            "id": c[1].id,
+            "name": c[1].name,
+            "oracletext": c[1].oracletext,
+            "count": c[0].count,
+            "iscommander": c[0].iscommander,
+            "iscompanion": c[0].iscompanion,
+            "issideboard": c[0].issideboard,
+            "url": printing.cardimage if printing else "",
+            "backurl": (backPrinting.cardimage if backPrinting else None) if printing else "",
+        })
+
+    formattedTokens = []
+    for t in tokenMap:
+        tokenPrinting = firstPrints.get(t)
+        formattedTokens.append({
+            "id": t,
+            "url": tokenPrinting.cardimage if tokenPrinting else ""
+        })
+
+    return {"deck": deck, "cardlist":formattedCardlist,"tokens": formattedTokens}